@@ -1,49 +1,154 @@
+import asyncio
+import json
+import logging
+import os
 import time
 import util.web
+from util.cache import TTLCache, SingleFlight
 
+log = logging.getLogger(__name__)
 
-async def rtc_version(room):
+# Seconds a fetched rtc version is used before fetching it again.
+RTC_VERSION_TTL = 3600
+
+# Seconds a pre-fetched connect token is kept for use.
+CONNECT_INFO_TTL = 30
+# Seconds a profile is cached, and how many profiles are kept.
+PROFILE_TTL = 600
+PROFILE_CACHE_SIZE = 5000
+# Seconds an unknown account is remembered as unknown.
+PROFILE_NEGATIVE_TTL = 120
+
+# Process wide, shared by all clients.
+_rtc_version_cache = TTLCache(ttl=RTC_VERSION_TTL)
+_rtc_version_flight = SingleFlight()
+_connect_info_cache = TTLCache(ttl=CONNECT_INFO_TTL)
+_profile_cache = TTLCache(ttl=PROFILE_TTL, maxsize=PROFILE_CACHE_SIZE)
+_profile_flight = SingleFlight()
+# Cached in place of the profile of an account that does not exist.
+_UNKNOWN_ACCOUNT = object()
+
+
+async def _fetch_rtc_version(room):
+    _url = f"https://tinychat.com/room/{room}"
+    response = await util.web.http_get(url=_url)
+
+    if response["content"] is not None:
+        pattern = '<link rel="manifest" href="/webrtc/'
+        try:
+            return (
+                response["content"].split(pattern)[1].split('/manifest.json">')[0]
+            )
+        except IndexError:
+            log.error(f"failed to parse rtc version from: {_url}")
+
+
+def _load_rtc_version(cache_file):
+    try:
+        with open(cache_file) as f:
+            data = json.load(f)
+        age = time.time() - data["time"]
+        _rtc_version_cache.set("rtc_version", data["version"], ttl=RTC_VERSION_TTL - age)
+    except (IOError, ValueError, KeyError) as e:
+        log.debug(f"no usable rtc version cache file: {e}")
+
+
+def _save_rtc_version(cache_file, version):
+    try:
+        _dir = os.path.dirname(cache_file)
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir)
+        with open(cache_file, mode="w") as f:
+            json.dump({"version": version, "time": time.time()}, f)
+    except IOError as ioe:
+        log.error(f"failed to write rtc version cache file: {cache_file} IOError: {ioe}")
+
+
+async def rtc_version(room, cache_file=None):
     """
     Parse the current tinychat RTC version.
 
+    The version is cached process wide for RTC_VERSION_TTL seconds, and
+    concurrent calls share a single fetch. If the fetch fails, the last
+    known good version is returned, even if it has expired.
+
     :param room: This could be a static room name, since we just need the html of any room.
     :type room: str
+    :param cache_file: Optional file to persist the version in between runs.
+    :type cache_file: str | None
     :return: The current tinychat rtc version, or None on parse failure.
     :rtype: str | None
     """
-    _url = f"https://tinychat.com/room/{room}"
-    response = await util.web.http_get(url=_url)
+    if cache_file and len(_rtc_version_cache) == 0:
+        _load_rtc_version(cache_file)
 
-    if response["content"] is not None:
-        pattern = '<link rel="manifest" href="/webrtc/'
-        return (
-            response["content"].split(pattern)[1].split('/manifest.json">')[0]
-        )
+    version = _rtc_version_cache.get("rtc_version")
+    if version is not None:
+        return version
+
+    version = await _rtc_version_flight.do("rtc_version", _fetch_rtc_version, room)
+    if version is None:
+        return _rtc_version_cache.get_stale("rtc_version")
+
+    if _rtc_version_cache.get("rtc_version") != version:
+        _rtc_version_cache.set("rtc_version", version)
+        if cache_file:
+            _save_rtc_version(cache_file, version)
+    return version
+
+
+async def _fetch_connect_info(room):
+    _url = f"https://tinychat.com/api/v1.0/room/token/{room}"
+
+    response = await util.web.http_get(url=_url, json=True)
+    if response["json"] is not None:
+        return response["json"]
 
 
 async def get_connect_info(room):
     """ 
     Get the connect token needed for connecting to the WebRTC application.
 
+    A token pre-fetched with prewarm is used once, if it has not expired.
+
     :param room: The room to get the token for.
     :type room: str
     :return: JSON {'result': 'token', 'endpoint': 'wss://address'} or None on failure to fetch token.
     :rtype: str | None
     """
-    _url = f"https://tinychat.com/api/v1.0/room/token/{room}"
-
-    response = await util.web.http_get(url=_url, json=True)
-    if response["json"] is not None:
-        return response["json"]
+    connect_info = _connect_info_cache.get(room)
+    if connect_info is not None:
+        _connect_info_cache.delete(room)
+        return connect_info
+    return await _fetch_connect_info(room)
 
 
-async def user_info(tc_account):
-    """ 
-    Finds info for a given tinychat account name.
+async def prewarm(rooms, cache_file=None):
+    """
+    Pre-fetch the connect tokens for rooms, and the rtc version, concurrently.
 
-    :param tc_account: str the account name.
-    :return: dict {'username', 'tinychat_id', 'last_active', 'name', 'location', 'biography'} or None on error.
+    :param rooms: list of room names.
+    :param cache_file: Optional rtc version cache file, see rtc_version.
+    :type cache_file: str | None
+    :return: The number of rooms a token was fetched for.
+    :rtype: int
     """
+    rooms = list(rooms)
+    if not rooms:
+        return 0
+    results = await asyncio.gather(
+        rtc_version(rooms[0], cache_file=cache_file),
+        *(_fetch_connect_info(room) for room in rooms)
+    )
+    fetched = 0
+    for room, connect_info in zip(rooms, results[1:]):
+        if connect_info is not None:
+            _connect_info_cache.set(room, connect_info)
+            fetched += 1
+    return fetched
+
+
+async def _fetch_user_info(tc_account):
     url = f"https://tinychat.com/api/v1.0/profile?username={tc_account}"
     response = await util.web.http_get(url=url, json=True)
     if response["json"] is not None:
@@ -64,7 +169,64 @@ async def user_info(tc_account):
                 "biography": biography,
             }
         else:
-            return None
+            return _UNKNOWN_ACCOUNT
+
+
+async def user_info(tc_account):
+    """ 
+    Finds info for a given tinychat account name.
+
+    Profiles are cached process wide, unknown accounts are cached for a
+    shorter time, and concurrent lookups of the same account share one request.
+    Request failures are not cached.
+
+    :param tc_account: str the account name.
+    :return: dict {'username', 'tinychat_id', 'last_active', 'name', 'location', 'biography'} or None on error.
+    """
+    info = _profile_cache.get(tc_account)
+    if info is None:
+        info = await _profile_flight.do(tc_account, _fetch_user_info, tc_account)
+        if info is _UNKNOWN_ACCOUNT:
+            _profile_cache.set(tc_account, info, ttl=PROFILE_NEGATIVE_TTL)
+        elif info is not None:
+            _profile_cache.set(tc_account, info)
+
+    if info is _UNKNOWN_ACCOUNT:
+        return None
+    return info
+
+
+async def user_info_many(tc_accounts, concurrency=4, rate=10):
+    """
+    Finds info for many tinychat account names concurrently.
+
+    Cached accounts are answered straight away, the rest are fetched
+    with at most `concurrency` requests open, started at most `rate` per second.
+
+    :param tc_accounts: list of account names.
+    :param concurrency: int the maximum number of requests open at once.
+    :param rate: int | float the maximum number of requests started per second.
+    :return: dict where the key is the account name and the value is the user_info dict or None.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    lock = asyncio.Lock()
+    interval = 1.0 / rate
+    next_start = [0.0]
+
+    async def _lookup(tc_account):
+        if tc_account in _profile_cache:
+            return await user_info(tc_account)
+        async with semaphore:
+            async with lock:
+                wait = next_start[0] - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                next_start[0] = time.monotonic() + interval
+            return await user_info(tc_account)
+
+    accounts = list(dict.fromkeys(tc_accounts))
+    results = await asyncio.gather(*(_lookup(account) for account in accounts))
+    return dict(zip(accounts, results))
 
 
 async def spy_info(room):
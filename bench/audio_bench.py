@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure the CPU cost and pacing of the audio tracks.
+
+Runs a number of concurrent streams of each track in real time, receiving
+every frame like the encoder would, and reports the CPU time per stream per
+second of audio, the frames received against the frames due, and how late
+the latest frame was. The wav track plays a generated file.
+
+Usage: python3 bench/audio_bench.py [streams] [seconds]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media  # noqa: E402
+
+
+def write_wav(path, seconds=2, sample_rate=44100, channels=2):
+    samples = numpy.arange(seconds * sample_rate * channels) % 1000
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.astype(numpy.int16).tobytes())
+
+
+async def consume(track, seconds):
+    """ Receive frames for seconds, returning the frame count and the latest a frame came. """
+    loop = asyncio.get_event_loop()
+    frames = 0
+    max_late = 0.0
+    start = None
+    while True:
+        frame = await track.recv()
+        now = loop.time()
+        if start is None:
+            start = now
+        due = start + frame.pts / track.sample_rate
+        max_late = max(max_late, now - due)
+        frames += 1
+        if now - start >= seconds:
+            return frames, max_late
+
+
+async def run(name, make_track, streams, seconds):
+    tracks = [make_track() for _ in range(streams)]
+    start = time.process_time()
+    results = await asyncio.gather(*(consume(track, seconds) for track in tracks))
+    cpu = time.process_time() - start
+    expected = int(seconds / media.AUDIO_PTIME) + 1
+    received = min(frames for frames, _ in results)
+    max_late = max(late for _, late in results)
+    print(f"{name:>8}: {cpu / streams / seconds * 1000:5.2f} ms cpu per stream per second,"
+          f" at least {received}/{expected} frames, latest frame {max_late * 1000:5.1f} ms late")
+
+
+async def main(streams, seconds, wav_path):
+    print(f"{streams} streams, {seconds}s")
+    await run("silence", media.SilenceAudioStreamTrack, streams, seconds)
+    await run("tone", lambda: media.ToneAudioStreamTrack(440, channels=2), streams, seconds)
+    await run("wav", lambda: media.WavAudioStreamTrack(wav_path), streams, seconds)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.wav")
+        write_wav(path)
+        asyncio.run(main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+            float(sys.argv[2]) if len(sys.argv) > 2 else 5.0,
+            path,
+        ))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Run many captcha solves against a fake local Anti-Captcha server.
+
+The server implements createTask and getTaskResult, and solves each task
+after a random delay around the given mean solve time. AntiCaptcha is
+pointed at it through api_url and solves the captchas concurrently. The
+fixed interval polling used before, one poll loop per captcha, is run
+against the same server for comparison. Latency is the time from
+createTask until the solution is returned, and the server counts the
+getTaskResult requests.
+
+All the delays, on both sides, are multiplied by the time scale so a run
+takes seconds instead of minutes; the reported latencies are scaled back.
+
+Usage: python3 bench/captcha_bench.py [captchas] [mean solve time] [time scale]
+"""
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import captcha  # noqa: E402
+
+
+class FakeAntiCaptcha:
+    """ A local stand in for the Anti-Captcha api. """
+
+    def __init__(self, mean_solve_time, scale):
+        self.mean_solve_time = mean_solve_time
+        self.scale = scale
+        self.tasks = {}
+        self.task_ids = itertools.count(1)
+        self.status_requests = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/createTask", self.create_task)
+        app.router.add_post("/getTaskResult", self.get_task_result)
+        return app
+
+    async def create_task(self, request):
+        await request.json()
+        task_id = next(self.task_ids)
+        solve_time = max(1.0, random.gauss(self.mean_solve_time, self.mean_solve_time / 4))
+        self.tasks[task_id] = time.monotonic() + solve_time * self.scale
+        return web.json_response({"errorId": 0, "taskId": task_id})
+
+    async def get_task_result(self, request):
+        self.status_requests += 1
+        j = await request.json()
+        ready_at = self.tasks.get(j["taskId"])
+        if ready_at is None:
+            return web.json_response({"errorId": 16, "errorCode": "ERROR_NO_SUCH_CAPCHA_ID"})
+        if time.monotonic() < ready_at:
+            return web.json_response({"errorId": 0, "status": "processing"})
+        return web.json_response({
+            "errorId": 0,
+            "status": "ready",
+            "solution": {"gRecaptchaResponse": "token-%d" % j["taskId"]},
+        })
+
+
+async def fixed_interval_solve(solver, scale):
+    """ The polling AntiCaptcha.solve_captcha did before, one loop per captcha. """
+    j = await solver._call("createTask", {"clientKey": solver.api_key, "task": {}})
+    payload = {"clientKey": solver.api_key, "taskId": j["taskId"]}
+    await asyncio.sleep(10 * scale)
+    while True:
+        j = await solver._call("getTaskResult", payload)
+        if j["status"] != "processing":
+            return j["solution"]["gRecaptchaResponse"]
+        await asyncio.sleep(6 * scale)
+
+
+async def timed(coro):
+    start = time.monotonic()
+    result = await coro
+    assert result is not None
+    return time.monotonic() - start
+
+
+async def run(name, server, solve, count, scale):
+    server.status_requests = 0
+    start = time.monotonic()
+    latencies = await asyncio.gather(*(timed(solve()) for _ in range(count)))
+    elapsed = time.monotonic() - start
+    latencies = sorted(latency / scale for latency in latencies)
+    print(f"{name:>15}: latency mean {statistics.mean(latencies):5.1f}s,"
+          f" p95 {latencies[int(len(latencies) * 0.95)]:5.1f}s,"
+          f" max {latencies[-1]:5.1f}s;"
+          f" {server.status_requests} status requests"
+          f" ({server.status_requests / count:.1f} per captcha);"
+          f" {elapsed / scale:.1f}s total")
+
+
+async def main(count, mean_solve_time, scale):
+    server = FakeAntiCaptcha(mean_solve_time, scale)
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    api_url = f"http://127.0.0.1:{port}/"
+    print(f"{count} captchas, mean solve time {mean_solve_time}s, time scale {scale}")
+
+    try:
+        async with captcha.AntiCaptcha("key", api_url, min_delay=2.0 * scale,
+                                       max_delay=10.0 * scale) as solver:
+            await run("fixed interval", server,
+                      lambda: fixed_interval_solve(solver, scale), count, scale)
+
+        async with captcha.AntiCaptcha("key", api_url, min_delay=2.0 * scale,
+                                       max_delay=10.0 * scale) as solver:
+            solver.avg_solve_time *= scale
+            # The first round refines the average solve time, like a running bot would.
+            for round_ in ("adaptive, cold", "adaptive, warm"):
+                await run(round_, server,
+                          lambda: solver.solve_captcha("sitekey", "https://tinychat.com"),
+                          count, scale)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 200,
+        float(args[1]) if len(args) > 1 else 15.0,
+        float(args[2]) if len(args) > 2 else 0.1,
+    ))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Frames per second of the JSON codecs in util.codec.
+
+Decodes every frame of a corpus, and encodes the decoded payloads again,
+with each installed codec. The corpus is a file with one websocket frame
+per line, e.g the DATA lines of a debug log with the prefix cut off.
+Without a corpus file, a synthetic one of typical Tinychat frames is used.
+
+Usage: python3 bench/codec_bench.py [corpus] [rounds]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import codec  # noqa: E402
+
+
+def _user(i):
+    return {
+        "achievement_url": "", "avatar": f"https://avatars.tinychat.com/{i}.png",
+        "featured": False, "giftpoints": 0, "handle": 1000 + i, "lurker": i % 7 == 0,
+        "mod": i % 11 == 0, "nick": f"guest-{i}", "owner": False, "session_id": f"{i:032x}",
+        "subscription": 0, "username": f"user{i}" if i % 3 else "",
+    }
+
+
+def synthetic_corpus(count=20000):
+    """ A corpus with the mix of frames of a busy room. """
+    rnd = random.Random(1)
+    frames = [json.dumps({"tc": "userlist", "users": [_user(i) for i in range(300)]})]
+    for i in range(count):
+        kind = rnd.random()
+        if kind < 0.6:
+            frame = {"tc": "msg", "handle": 1000 + rnd.randrange(300),
+                     "text": "hello there " * rnd.randrange(1, 8)}
+        elif kind < 0.75:
+            frame = dict(_user(rnd.randrange(300, 5000)), tc="join")
+        elif kind < 0.85:
+            frame = {"tc": "quit", "handle": 1000 + rnd.randrange(5000)}
+        elif kind < 0.95:
+            frame = {"tc": "nick", "handle": 1000 + rnd.randrange(300), "nick": f"nick{i}"}
+        else:
+            frame = {"tc": "ping"}
+        frames.append(json.dumps(frame))
+    return frames
+
+
+def run(codec_class, frames, rounds):
+    frames_bytes = [frame.encode("utf-8") for frame in frames]
+    loads = codec_class.loads
+    dumps = codec_class.dumps
+    results = {}
+
+    for name, data in (("loads str", frames), ("loads bytes", frames_bytes)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for frame in data:
+                loads(frame)
+        results[name] = len(data) * rounds / (time.perf_counter() - start)
+
+    payloads = [loads(frame) for frame in frames]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            dumps(payload)
+    results["dumps"] = len(payloads) * rounds / (time.perf_counter() - start)
+    return results
+
+
+def main(corpus_file, rounds):
+    if corpus_file:
+        with open(corpus_file, encoding="utf-8") as f:
+            frames = [line.strip() for line in f if line.strip()]
+        print(f"corpus: {corpus_file}, {len(frames)} frames")
+    else:
+        frames = synthetic_corpus()
+        print(f"corpus: synthetic, {len(frames)} frames")
+
+    for name in ("json", "ujson", "orjson"):
+        if not codec._AVAILABLE[name]:
+            print(f"{name:>7}: not installed")
+            continue
+        results = run(codec._CODECS[name], frames, rounds)
+        print(f"{name:>7}: " + ", ".join(f"{k} {v:9.0f} frames/s" for k, v in results.items()))
+
+
+if __name__ == "__main__":
+    _corpus = sys.argv[1] if len(sys.argv) > 1 else None
+    _rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    main(_corpus, _rounds)
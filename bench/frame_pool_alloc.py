@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Check that the steady state video path does not allocate frame buffers.
+
+Runs frame_from_bgr with a FramePool, frame_to_bgr with a dst array and
+FrameCompositor.compose under tracemalloc, and fails if the peak traced
+memory over a run of frames comes near the size of one frame. The paths
+without a pool are shown for comparison.
+
+Usage: python3 bench/frame_pool_alloc.py [width] [height]
+"""
+import os
+import sys
+import tracemalloc
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media  # noqa: E402
+
+FRAMES = 200
+WARMUP = 20
+
+
+def peak_per_run(func):
+    """ The peak traced memory while calling func FRAMES times, after a warm up. """
+    for _ in range(WARMUP):
+        func()
+    tracemalloc.start()
+    try:
+        for _ in range(FRAMES):
+            func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(width, height):
+    frame_size = width * height * 3 // 2
+    # Anything close to a frame would be a buffer allocated per frame.
+    limit = frame_size // 10
+
+    data_bgr = numpy.zeros((height, width, 3), numpy.uint8)
+    data_bgr[:] = media.RED
+    pool = media.FramePool(width, height)
+    dst = numpy.empty((height, width, 3), numpy.uint8)
+    frames = [media.ColorVideoStreamTrack(width, height, color).frame
+              for color in (media.BLUE, media.GREEN, media.RED)]
+    compositor = media.FrameCompositor()
+
+    checks = [
+        ("frame_from_bgr, new frame", lambda: media.frame_from_bgr(data_bgr), False),
+        ("frame_from_bgr, pool", lambda: media.frame_from_bgr(data_bgr, pool), True),
+        ("frame_to_bgr, new array", lambda: media.frame_to_bgr(frames[0]), False),
+        ("frame_to_bgr, dst", lambda: media.frame_to_bgr(frames[0], dst), True),
+        ("FrameCompositor.compose", lambda: compositor.compose(frames), True),
+    ]
+
+    print(f"{width}x{height}, frame size {frame_size} bytes, {FRAMES} frames, limit {limit} bytes")
+    failed = False
+    for name, func, pooled in checks:
+        peak = peak_per_run(func)
+        status = ""
+        if pooled:
+            status = "ok" if peak < limit else "FAIL"
+            failed = failed or peak >= limit
+        print(f"{name:>28}: peak {peak:9d} bytes {status}")
+
+    try:
+        media.frame_from_bgr(numpy.zeros((height * 2, width * 2, 3), numpy.uint8), pool)
+    except ValueError:
+        print(f"{'size mismatch':>28}: raises ValueError ok")
+    else:
+        print(f"{'size mismatch':>28}: FAIL, no error")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    _width = int(sys.argv[1]) if len(sys.argv) > 1 else 640
+    _height = int(sys.argv[2]) if len(sys.argv) > 2 else 480
+    sys.exit(main(_width, _height))
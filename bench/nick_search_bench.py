@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Indexed nick searches in user.Users against the old linear scans.
+
+Fills Users with synthetic users and bans, then runs the same random
+search strings through search_containing / search_banlist_containing and
+through a scan of every entry, as before the nick index. Also checks that
+both return the same results, in the same order.
+
+Usage: python3 bench/nick_search_bench.py [users] [bans] [searches]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import user  # noqa: E402
+
+SYLLABLES = ("ka", "zu", "mi", "ro", "te", "shi", "na", "lo", "vex", "dra", "bo", "qui")
+
+
+def _nick(rnd):
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))) + str(rnd.randrange(100))
+
+
+def _part(rnd, nick):
+    start = rnd.randrange(max(1, len(nick) - 5))
+    return nick[start:start + 5]
+
+
+def _scan(entries, contains):
+    return [entry for entry in entries.values() if str(contains) in entry.nick]
+
+
+def _time(func, searches):
+    start = time.perf_counter()
+    for text in searches:
+        func(text)
+    return (time.perf_counter() - start) / len(searches)
+
+
+def main(user_count, ban_count, search_count):
+    rnd = random.Random(1)
+    users = user.Users()
+
+    start = time.perf_counter()
+    users.add_many([{"handle": i, "nick": _nick(rnd)} for i in range(user_count)])
+    for i in range(ban_count):
+        users.add_banned_user({"id": i + 1, "nick": _nick(rnd), "username": ""})
+    print(f"{user_count} users and {ban_count} bans added and indexed in "
+          f"{time.perf_counter() - start:.2f}s")
+
+    nicks = [u.nick for u in users.banlist.values()]
+    search_sets = (
+        # A part of someone's nick, the usual moderation lookup.
+        ("selective", [_part(rnd, rnd.choice(nicks)) for _ in range(search_count)]),
+        # A single syllable, matching a large part of the room.
+        ("broad", [rnd.choice(SYLLABLES) for _ in range(search_count)]),
+    )
+    for set_name, searches in search_sets:
+        for text in searches:
+            assert users.search_containing(text) == _scan(users.all, text)
+            assert users.search_banlist_containing(text) == _scan(users.banlist, text)
+
+        print(f"{set_name} searches:")
+        rows = (
+            ("users", lambda t: _scan(users.all, t), users.search_containing),
+            ("bans", lambda t: _scan(users.banlist, t), users.search_banlist_containing),
+        )
+        for name, scan, indexed in rows:
+            scan_time = _time(scan, searches)
+            indexed_time = _time(indexed, searches)
+            print(f"  {name:>6}: scan {scan_time * 1e6:8.0f} us, index {indexed_time * 1e6:8.0f} us "
+                  f"per search ({scan_time / indexed_time:.1f}x)")
+        prefix_time = _time(lambda t: users.search_banlist_containing(t, prefix=True), searches)
+        print(f"  {'prefix':>6}: index {prefix_time * 1e6:8.0f} us per banlist search")
+
+if __name__ == "__main__":
+    _users = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    _bans = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    _searches = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    main(_users, _bans, _searches)
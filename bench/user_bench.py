@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Measure the memory and construction time of User and BannedUser.
+
+Builds synthetic join and banlist payloads and creates users from them,
+once with the slotted classes and from_info, and once with the dict backed
+classes that were used before, copied below. The traced memory is what the
+user objects hold on to; the payloads themselves are built beforehand.
+
+Usage: python3 bench/user_bench.py [count]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import user  # noqa: E402
+
+
+class LegacyBannedUser:
+    """ BannedUser as it was before it had slots. """
+
+    def __init__(self, **kwargs):
+        self.ban_id = kwargs.get("id", 0)
+        self.nick = kwargs.get("nick", "")
+        self.req_id = kwargs.get("req", 0)
+        self.success = kwargs.get("success", False)
+        self.account = kwargs.get("username", "")
+        self.banned_by = kwargs.get("moderator", "")
+        self.reason = kwargs.get("reason", "")
+
+
+class LegacyUser:
+    """ User as it was before it had slots. """
+
+    def __init__(self, **kwargs):
+        self.id = kwargs.get("handle")
+        self.nick = kwargs.get("nick", "")
+        self.account = kwargs.get("username", "")
+        self.giftpoints = kwargs.get("giftpoints", 0)
+        self.featured = kwargs.get("featured", False)
+        self.subscription = kwargs.get("subscription", 0)
+        self.session_id = kwargs.get("session_id", "")
+        self.achievement_url = kwargs.get("achievement_url", "")
+        self.avatar = kwargs.get("avatar", "")
+        self.is_lurker = kwargs.get("lurker", False)
+        self.is_mod = kwargs.get("mod", False)
+        self.is_owner = kwargs.get("owner", False)
+        self.is_broadcasting = False
+        self.is_waiting = False
+        #
+        self.user_level = 5
+        self.join_time = time.time()
+        self.tinychat_id = None
+        self.last_login = None
+        self.last_msg = None
+        self.msg_time = 0.0
+
+
+def join_payloads(count):
+    return [{
+        "handle": i,
+        "nick": "guest-%d" % i,
+        "username": "account%d" % i if i % 3 else "",
+        "giftpoints": i % 50,
+        "featured": False,
+        "subscription": 0,
+        "session_id": "session%d" % i,
+        "achievement_url": "",
+        "avatar": "https://avatars.tinychat.com/%d.png" % i,
+        "lurker": i % 10 == 0,
+        "mod": i % 25 == 0,
+        "owner": False,
+    } for i in range(count)]
+
+
+def ban_payloads(count):
+    return [{
+        "id": i,
+        "nick": "banned-%d" % i,
+        "req": i,
+        "success": True,
+        "username": "account%d" % i if i % 2 else "",
+        "moderator": "mod",
+        "reason": "",
+    } for i in range(count)]
+
+
+def measure(create, payloads):
+    """ The seconds and the traced bytes it takes to create an object per payload. """
+    gc.collect()
+    start = time.perf_counter()
+    objects = [create(item) for item in payloads]
+    elapsed = time.perf_counter() - start
+    del objects
+    gc.collect()
+    tracemalloc.start()
+    try:
+        objects = [create(item) for item in payloads]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objects
+    return elapsed, size
+
+
+def main(count):
+    print(f"{count} objects")
+    cases = [
+        ("User", join_payloads(count),
+         lambda item: LegacyUser(**item), user.User.from_info),
+        ("BannedUser", ban_payloads(count),
+         lambda item: LegacyBannedUser(**item), user.BannedUser.from_info),
+    ]
+    for name, payloads, legacy, slotted in cases:
+        old_time, old_size = measure(legacy, payloads)
+        new_time, new_size = measure(slotted, payloads)
+        print(f"{name:>10}: dict {old_size / count:6.0f} B, {old_time * 1e6 / count:5.2f} us;"
+              f" slots {new_size / count:6.0f} B, {new_time * 1e6 / count:5.2f} us"
+              f" ({old_size / new_size:.1f}x less memory)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare util.web (aiohttp) against the old requests + run_in_executor path.
+
+Both make the same GET requests to a local HTTP server, with the same
+number of requests in flight. The old path needs requests, which is no
+longer a dependency: pip install requests
+
+Usage: python3 bench/web_bench.py [requests] [concurrency]
+"""
+import asyncio
+import http.server
+import multiprocessing
+import os
+import socketserver
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import web  # noqa: E402
+
+BODY = b'{"result": "success", "endpoint": "wss://wss.tinychat.com", "token": "abc"}'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def _serve(server):
+    server.serve_forever()
+
+
+def _executor_get(session, url):
+    # The old util.web.http_get, minus the error handling.
+    r = session.get(url, headers=web.DEFAULT_HEADER, timeout=20)
+    return dict(content=r.text, json=r.json(), cookies=r.cookies, headers=r.headers, status_code=r.status_code)
+
+
+async def _run(name, get, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            result = await get()
+            assert result["status_code"] == 200
+
+    await get()  # Warm up the connection pool.
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*[one() for _ in range(count)])
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    print(f"{name:>10}: {count / wall:8.0f} req/s, {cpu / count * 1e6:6.0f} us CPU per request")
+
+
+async def main(count, concurrency):
+    # The server runs in its own process, so it does not count towards the CPU time.
+    server = _Server(("127.0.0.1", 0), _Handler)
+    process = multiprocessing.Process(target=_serve, args=(server,), daemon=True)
+    process.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api"
+    print(f"{count} GET requests, {concurrency} in flight")
+
+    try:
+        import requests
+    except ImportError:
+        print("  executor: skipped, requests is not installed")
+    else:
+        loop = asyncio.get_event_loop()
+        session = requests.session()
+        await _run(
+            "executor",
+            lambda: loop.run_in_executor(None, partial(_executor_get, session, url)),
+            count,
+            concurrency,
+        )
+
+    await _run("aiohttp", lambda: web.http_get(url, json=True), count, concurrency)
+    await web.close_session()
+    process.terminate()
+
+
+if __name__ == "__main__":
+    _count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    _concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    asyncio.get_event_loop().run_until_complete(main(_count, _concurrency))
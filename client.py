@@ -1,6 +1,8 @@
 import logging
 import asyncio
 import pinylib
+import util.web
+from util import captcha
 
 log = logging.getLogger(__name__)
 
@@ -47,7 +49,11 @@ async def main():
             client.account = None
             client.password = None
 
-    await client.connect()
+    try:
+        await client.run()
+    finally:
+        await util.web.close_session()
+        await captcha.close_solvers()
 
 
 if __name__ == "__main__":
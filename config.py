@@ -8,8 +8,38 @@ SOLVE_CAPTCHAS = False
 API_KEY = ""
 # Fallback rtc version.
 FALLBACK_RTC_VERSION = "2.0.22-4"
+# File to keep the last fetched rtc version in between runs, empty to disable.
+RTC_VERSION_CACHE_FILE = "rooms/rtc_version.json"
+# Rate limit for sent moderation and chat messages, per second, and the allowed burst.
+SEND_RATE = 3
+SEND_BURST = 6
+# Maximum queued outgoing messages before senders wait.
+SEND_QUEUE_SIZE = 500
+# Seconds to wait for a TCP connection to one address of the server, before trying the next.
+CONNECT_TIMEOUT = 10
+# Reconnect automatically when the connection is lost.
+AUTO_RECONNECT = True
+# Reconnect backoff, the delay doubles from the base delay up to the max delay (seconds).
+RECONNECT_BASE_DELAY = 2
+RECONNECT_MAX_DELAY = 300
+# Give up after this many failed reconnects in a row, 0 to never give up.
+RECONNECT_MAX_ATTEMPTS = 0
+# JSON codec for the websocket, one of auto, orjson, ujson or json.
+JSON_CODEC = "auto"
+# Number of concurrent event workers, events from the same user are still handled in order.
+EVENT_WORKERS = 4
+# Maximum queued events per worker before the receive loop waits.
+EVENT_QUEUE_SIZE = 256
+# Seconds to wait before re-requesting the banlist, bans made within this window share one request.
+BANLIST_REFRESH_WINDOW = 5
 # Log chat messages and events.
 CHAT_LOGGING = False
+# Size in bytes at which a chat log file is rotated, 0 to only rotate by date.
+CHAT_LOG_MAX_BYTES = 5242880
+# Number of rotated chat log files kept per day.
+CHAT_LOG_BACKUP_COUNT = 5
+# Maximum seconds chat log lines are buffered before being written.
+CHAT_LOG_FLUSH_INTERVAL = 2
 # Show additional info/errors in console.
 DEBUG_MODE = False
 # Log debug info to file.
@@ -18,6 +48,8 @@ DEBUG_TO_FILE = False
 DEBUG_LEVEL = 30
 # Use colors for the console.
 CONSOLE_COLORS = True
+# Maximum console lines waiting to be written, lines beyond this are dropped.
+CONSOLE_QUEUE_SIZE = 10000
 # Time format.
 USE_24HOUR = True
 # The name of pinylib's debug log file.
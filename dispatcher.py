@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Concurrent event dispatcher module"""
+
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+# Events answered straight from the receive loop.
+INLINE_EVENTS = ("ping", "closed")
+# Events that every later event may depend on, these wait for the workers to drain.
+BARRIER_EVENTS = ("joined", "userlist")
+
+
+class EventDispatcher:
+    """
+    Runs handler events on a bounded pool of worker tasks.
+
+    Events are routed to a worker by the user ID (handle) of the event,
+    so events from the same user are handled in the order they arrived,
+    while a slow event from one user does not hold up everyone else.
+    Events without a handle are routed by event name.
+
+    Each worker has its own bounded queue. When a queue is full, dispatch()
+    waits for room in it, which in turn stops the receive loop from reading
+    more frames (backpressure).
+    """
+
+    def __init__(self, handler, workers=4, queue_size=256):
+        """
+        Initialize the dispatcher.
+
+        :param handler: The event handler to fire events on.
+        :type handler: handler.EventHandler
+        :param workers: The number of worker tasks.
+        :type workers: int
+        :param queue_size: The maximum number of queued events per worker.
+        :type queue_size: int
+        """
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._queues = []
+        self._tasks = []
+
+    @property
+    def is_running(self):
+        return len(self._tasks) > 0
+
+    @property
+    def pending(self):
+        """
+        Returns the number of events waiting to be handled.
+
+        :rtype: int
+        """
+        return sum(queue.qsize() for queue in self._queues)
+
+    def start(self):
+        """ Start the worker tasks. """
+        if self.is_running:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.ensure_future(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self):
+        """ Stop the worker tasks, dropping any queued events. """
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    async def drain(self):
+        """ Wait until every queued event has been handled. """
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    async def dispatch(self, client, event, var):
+        """
+        Hand an event to its worker.
+
+        :param client: The client the event belongs to.
+        :type client: pinylib.TinychatRTCClient
+        :param event: The event name.
+        :type event: str
+        :param var: The event data.
+        :type var: dict
+        """
+        if not self.is_running or event in INLINE_EVENTS:
+            await self.handler.fire(client, event, var)
+        elif event in BARRIER_EVENTS:
+            await self.drain()
+            await self.handler.fire(client, event, var)
+        else:
+            key = var.get("handle", event)
+            queue = self._queues[hash(key) % self.workers]
+            await queue.put((client, event, var))
+
+    async def _worker(self, queue):
+        while True:
+            client, event, var = await queue.get()
+            try:
+                await self.handler.fire(client, event, var)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"error handling event {event}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
@@ -3,19 +3,87 @@
 
 """Chat events handler module"""
 
-import time
+import inspect
+import logging
+from collections import Counter
+
+log = logging.getLogger(__name__)
 
 
 class UnhandledEvent(Exception):
     pass
 
 
+def event(name):
+    """
+    Decorator to bind a handler method to an event name other than the method name.
+
+    :param name: The event name as sent by the server in the `tc` field.
+    :type name: str
+    """
+    def decorator(func):
+        func.event_name = name
+        return func
+
+    return decorator
+
+
 class EventHandler(object):
+    def __init__(self):
+        """
+        Build the dispatch table once, so fire() is a single dict lookup.
+
+        Every public coroutine method of the (sub)class is registered
+        under its own name, or the name given with the event decorator.
+        """
+        self.unhandled = Counter()
+        self._events = {}
+        for name in dir(type(self)):
+            if name.startswith("_") or name in ("fire", "register"):
+                continue
+            func = getattr(type(self), name)
+            if inspect.iscoroutinefunction(func):
+                self._events[getattr(func, "event_name", name)] = getattr(self, name)
+
+    @property
+    def events(self):
+        """
+        Returns the names of all the handled events.
+
+        :return: A list of event names.
+        :rtype: list
+        """
+        return list(self._events)
+
+    def register(self, event_name, func=None):
+        """
+        Register a coroutine for an event, replacing any existing handler.
+
+        Can be used directly or as a decorator. The coroutine is called
+        with the same (client, var) arguments as the handler methods.
+
+        :param event_name: The event name.
+        :type event_name: str
+        :param func: The coroutine to call for the event.
+        """
+        def decorator(_func):
+            self._events[event_name] = _func
+            return _func
+
+        if func is None:
+            return decorator
+        return decorator(func)
+
     async def fire(self, client, event, var=None):
-        if hasattr(self, event):
-            await getattr(self, event)(client, var)
+        try:
+            func = self._events[event]
+        except KeyError:
+            # Counting is cheap, and the message is only built when debugging.
+            self.unhandled[event] += 1
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(UnhandledEvent(f"{event} not handled"))
         else:
-            print(UnhandledEvent(f"{event} not handled"))
+            await func(client, var)
 
 
 class Handler(EventHandler):
@@ -33,8 +101,7 @@ class Handler(EventHandler):
         await client.on_room_settings(var["room"])
 
     async def userlist(self, client, var):
-        for _user in var["users"]:
-            await client.on_userlist(_user)
+        await client.on_userlist_many(var["users"])
 
     async def join(self, client, var):
         await client.on_join(var)
@@ -48,7 +115,7 @@ class Handler(EventHandler):
     async def ban(self, client, var):
         await client.on_ban(var)
 
-    async def unabn(self, client, var):
+    async def unban(self, client, var):
         await client.on_unban(var)
 
     async def banlistmsg(self, client, var):
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Multi-room client manager module"""
+
+import asyncio
+import json
+import logging
+import sys
+
+import pinylib
+import apis.tinychat
+import util.web
+from util import captcha
+from util.cache import SingleFlight
+
+log = logging.getLogger(__name__)
+
+
+# Keys a room config can have, all of them but room are optional.
+ROOM_KEYS = ("room", "nickname", "account", "password")
+
+
+def validate_room(item):
+    """
+    Validate a room config.
+
+    :param item: A room name, or a room config.
+    :type item: str | dict
+    :return: The room config, without keys set to None.
+    :rtype: dict
+    """
+    if isinstance(item, str):
+        item = {"room": item}
+    if not isinstance(item, dict):
+        raise ValueError(f"room config must be a name or an object, got: {item!r}")
+    unknown = set(item) - set(ROOM_KEYS)
+    if unknown:
+        raise ValueError(f"unknown room config keys: {sorted(unknown)}")
+    if not isinstance(item.get("room"), str) or not item["room"]:
+        raise ValueError(f"room config without a room name: {item.get('room')!r}")
+    for key in ROOM_KEYS:
+        if item.get(key) is not None and not isinstance(item[key], str):
+            raise ValueError(f"{item['room']}: {key} must be a string")
+    return {key: item[key] for key in ROOM_KEYS if item.get(key) is not None}
+
+
+def check_accounts(rooms):
+    """
+    Check that all the room configs that set an account set the same one, see RoomManager.
+
+    :param rooms: A list of room configs.
+    :type rooms: list
+    """
+    accounts = {room_config["account"] for room_config in rooms if room_config.get("account")}
+    if len(accounts) > 1:
+        raise ValueError(f"all rooms must use the same account, got: {sorted(accounts)}")
+
+
+def load_rooms(file_path):
+    """
+    Load the rooms to join from a JSON file.
+
+    The file contains a list where each item is either a room name,
+    or an object with a `room` key and optional `nickname`, `account`
+    and `password` keys. All the rooms that set an account must set the
+    same one, see RoomManager.
+
+    :param file_path: The path to the rooms file.
+    :type file_path: str
+    :return: A list of room configs.
+    :rtype: list
+    """
+    with open(file_path) as f:
+        items = json.load(f)
+
+    rooms = [validate_room(item) for item in items]
+    check_accounts(rooms)
+    return rooms
+
+
+class RoomManager:
+    """
+    Runs a client per room, all on the same event loop.
+
+    The clients share the process wide HTTP session (util.web), the profile
+    cache and the rtc version cache (apis.tinychat) and the captcha solver.
+    The login cookies are shared too, so all rooms must use the same account,
+    add_room raises ValueError for a room with a different account.
+    """
+
+    def __init__(self, rooms=None, client_class=pinylib.TinychatRTCClient):
+        """
+        Initialize the RoomManager.
+
+        :param rooms: A list of room configs, see load_rooms.
+        :type rooms: list | None
+        :param client_class: The client class to create for each room.
+        """
+        self.client_class = client_class
+        # The account all the rooms are signed in with.
+        self.account = pinylib.CONFIG.ACCOUNT or None
+        self.password = pinylib.CONFIG.PASSWORD or None
+        self._logins = SingleFlight()
+        self.clients = dict()
+        self._tasks = dict()
+        self._is_running = False
+        for room_config in rooms or []:
+            self.add_room(**room_config)
+
+    def add_room(self, room, nickname="", account=None, password=None):
+        """
+        Add a room, it is joined straight away if the manager is running.
+
+        :param room: The room name.
+        :type room: str
+        :param nickname: The nick name to use in the room.
+        :type nickname: str
+        :param account: Tinychat account name.
+        :type account: str | None
+        :param password: Tinychat account password.
+        :type password: str | None
+        :return: The client for the room.
+        :rtype: pinylib.TinychatRTCClient
+        """
+        if room in self.clients:
+            return self.clients[room]
+
+        if account:
+            if self.account is None:
+                self.account = account
+                self.password = password
+            elif account != self.account or (password and password != self.password):
+                # There is only one cookie jar, the rooms would sign each other out.
+                raise ValueError(
+                    f"{room}: account {account} differs from {self.account}, "
+                    f"all rooms must use the same account"
+                )
+
+        client = self.client_class(
+            room=room,
+            nickname=nickname,
+            account=self.account,
+            password=self.password,
+            solve_captchas=pinylib.CONFIG.SOLVE_CAPTCHAS,
+        )
+        self.clients[room] = client
+        if self._is_running:
+            self._start(room)
+        return client
+
+    async def remove_room(self, room):
+        """
+        Disconnect from a room and remove it.
+
+        :param room: The room name.
+        :type room: str
+        """
+        client = self.clients.pop(room, None)
+        task = self._tasks.pop(room, None)
+        if client is not None and client.is_connected:
+            await client.disconnect()
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _start(self, room):
+        self._tasks[room] = asyncio.ensure_future(self._run_client(self.clients[room]))
+
+    async def _run_client(self, client):
+        try:
+            if client.account and client.password:
+                # The clients share the login, so only one of them logs in at a time.
+                if not await self._logins.do(client.account, client.login):
+                    log.error(f"{client.room_name}: login failed for {client.account}")
+            await client.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"{client.room_name}: client stopped with error: {e}", exc_info=True)
+
+    async def start(self):
+        """ Join all the rooms, rooms added later are joined straight away. """
+        self._is_running = True
+        # A token fetched before signing in is a guest token, so the account
+        # is signed in first, and the tokens are only prewarmed if that worked.
+        signed_in = True
+        if self.account and self.password and self.clients:
+            client = next(iter(self.clients.values()))
+            signed_in = await self._logins.do(self.account, client.login)
+        if signed_in:
+            await apis.tinychat.prewarm(
+                list(self.clients), cache_file=pinylib.CONFIG.RTC_VERSION_CACHE_FILE or None
+            )
+        for room in self.clients:
+            if room not in self._tasks:
+                self._start(room)
+
+    async def run(self):
+        """ Join all the rooms and wait until every client has stopped. """
+        await self.start()
+        try:
+            while self._tasks:
+                await asyncio.wait(list(self._tasks.values()))
+                for room in [r for r, t in self._tasks.items() if t.done()]:
+                    del self._tasks[room]
+        finally:
+            self._is_running = False
+
+    async def stop(self):
+        """ Disconnect from all the rooms and close the shared sessions. """
+        for room in list(self.clients):
+            await self.remove_room(room)
+        await util.web.close_session()
+        await captcha.close_solvers()
+
+    def metrics(self):
+        """
+        Aggregate health and metrics of all the rooms.
+
+        :return: A dictionary with totals, and per room details under `rooms`.
+        :rtype: dict
+        """
+        rooms = dict()
+        for room, client in self.clients.items():
+            rooms[room] = {
+                "connected": client.is_connected,
+                "users": len(client.users.all),
+                "banned": len(client.users.banlist),
+                "reconnects": client.reconnect_count,
+                "queued_events": client.dispatcher.pending,
+                "unhandled_events": sum(client.handler.unhandled.values()),
+                "connect_timings": dict(client.connect_timings),
+            }
+        connected = sum(1 for r in rooms.values() if r["connected"])
+        return {
+            "rooms_total": len(rooms),
+            "rooms_connected": connected,
+            "healthy": connected == len(rooms),
+            "users": sum(r["users"] for r in rooms.values()),
+            "reconnects": sum(r["reconnects"] for r in rooms.values()),
+            "queued_events": sum(r["queued_events"] for r in rooms.values()),
+            "rooms": rooms,
+        }
+
+    async def log_metrics(self, interval=60):
+        """
+        Periodically log the aggregate metrics.
+
+        :param interval: Seconds between each log line.
+        :type interval: int | float
+        """
+        while True:
+            await asyncio.sleep(interval)
+            m = self.metrics()
+            log.info(
+                f"rooms: {m['rooms_connected']}/{m['rooms_total']} connected, "
+                f"users: {m['users']}, reconnects: {m['reconnects']}, "
+                f"queued events: {m['queued_events']}"
+            )
+
+
+async def main(rooms_file):
+    manager = RoomManager(load_rooms(rooms_file))
+    metrics_task = asyncio.ensure_future(manager.log_metrics())
+    try:
+        await manager.run()
+    finally:
+        metrics_task.cancel()
+        await manager.stop()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: manager.py rooms.json")
+        sys.exit(1)
+
+    if pinylib.CONFIG.DEBUG_TO_FILE:
+        formater = "%(asctime)s : %(levelname)s : %(filename)s : %(lineno)d : %(funcName)s() : %(name)s : %(message)s"
+        logging.basicConfig(
+            filename=pinylib.CONFIG.DEBUG_FILE_NAME,
+            level=pinylib.CONFIG.DEBUG_LEVEL,
+            format=formater,
+        )
+    else:
+        log.addHandler(logging.NullHandler())
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main(sys.argv[1]))
@@ -0,0 +1,809 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Media tracks module"""
+
+import asyncio
+import fractions
+import logging
+import math
+import os
+import queue
+import threading
+import wave
+
+import numpy
+import cv2
+from aiortc import AudioStreamTrack, VideoStreamTrack
+from aiortc.mediastreams import AudioFrame, VideoFrame
+
+log = logging.getLogger(__name__)
+
+# Clock rate of video timestamps, and the matching time base.
+VIDEO_CLOCK_RATE = 90000
+VIDEO_TIME_BASE = fractions.Fraction(1, VIDEO_CLOCK_RATE)
+# Default frames per second of paced video tracks.
+VIDEO_FPS = 30
+# Seconds a paced track may fall behind before it skips frames to catch up.
+MAX_VIDEO_LAG = 0.5
+# Frames a decoding track decodes ahead of the frame being sent.
+DECODE_QUEUE_SIZE = 8
+# Default sample rate and channels of audio tracks.
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_CHANNELS = 1
+# Seconds of audio in each audio frame.
+AUDIO_PTIME = 0.02
+# Seconds an audio track may fall behind before it skips frames to catch up.
+MAX_AUDIO_LAG = 0.2
+# File extensions of the images shown by ImageSlideshowVideoStreamTrack.
+IMAGE_EXTENSIONS = (".bmp", ".jpeg", ".jpg", ".png", ".webp")
+
+BLUE = (255, 0, 0)
+GREEN = (0, 255, 0)
+RED = (0, 0, 255)
+
+# Values of a black pixel in YUV.
+BLACK_Y = 0
+BLACK_UV = 128
+# Frames in a FramePool, a frame is reused after this many newer frames were handed out.
+FRAME_POOL_SIZE = 4
+
+
+class FramePool:
+    """
+    A ring of preallocated YUV 4:2:0 frames.
+
+    Each frame wraps its own numpy buffer with a memoryview, rather than a
+    copy of it in bytes, so filling a frame from the pool allocates nothing.
+    A frame is handed out again after `size` more frames, consumers such as
+    the encoder must be done with a frame by then.
+    """
+
+    def __init__(self, width, height, size=FRAME_POOL_SIZE):
+        """
+        Initialize the FramePool.
+
+        :param width: The frame width.
+        :type width: int
+        :param height: The frame height.
+        :type height: int
+        :param size: The number of frames in the ring.
+        :type size: int
+        """
+        self.width = width
+        self.height = height
+        self._slots = []
+        for _ in range(size):
+            buffer = numpy.empty((math.ceil(height * 12 / 8), width), numpy.uint8)
+            frame = VideoFrame(width=width, height=height, data=memoryview(buffer.reshape(-1)))
+            self._slots.append((buffer, frame))
+        self._index = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def buffers(self):
+        """ The buffers of all the frames, as (height * 3 / 2, width) arrays. """
+        return [buffer for buffer, _ in self._slots]
+
+    def next(self):
+        """
+        Get the next frame of the ring.
+
+        :return: The frame buffer and the frame backed by it.
+        :rtype: tuple
+        """
+        slot = self._slots[self._index]
+        self._index = (self._index + 1) % len(self._slots)
+        return slot
+
+
+def frame_from_bgr(data_bgr, pool=None):
+    """
+    Convert a BGR image to a YV12 frame.
+
+    :param data_bgr: The image.
+    :type data_bgr: numpy.ndarray
+    :param pool: Convert in to the next frame of this pool, the image must have the pool size.
+    :type pool: FramePool | None
+    :return: The frame.
+    :rtype: VideoFrame
+    """
+    if pool is None:
+        data_yuv = cv2.cvtColor(data_bgr, cv2.COLOR_BGR2YUV_YV12)
+        return VideoFrame(width=data_bgr.shape[1], height=data_bgr.shape[0], data=data_yuv.tobytes())
+    if data_bgr.shape[:2] != (pool.height, pool.width):
+        # cvtColor would write to a new array, and the pool frame would be left as it was.
+        raise ValueError(
+            f"image size {data_bgr.shape[1]}x{data_bgr.shape[0]} does not match "
+            f"the pool size {pool.width}x{pool.height}"
+        )
+    buffer, frame = pool.next()
+    cv2.cvtColor(data_bgr, cv2.COLOR_BGR2YUV_YV12, dst=buffer)
+    return frame
+
+
+def frame_to_bgr(frame, dst=None):
+    """
+    Convert a YV12 frame to a BGR image.
+
+    :param frame: The frame.
+    :type frame: VideoFrame
+    :param dst: A (height, width, 3) array to convert in to, instead of a new array.
+    :type dst: numpy.ndarray | None
+    :return: The image.
+    :rtype: numpy.ndarray
+    """
+    data_flat = numpy.frombuffer(frame.data, numpy.uint8)
+    data_yuv = data_flat.reshape((math.ceil(frame.height * 12 / 8), frame.width))
+    return cv2.cvtColor(data_yuv, cv2.COLOR_YUV2BGR_YV12, dst=dst)
+
+
+def black_frame(width, height):
+    """
+    Make a black YV12 frame.
+
+    :param width: The frame width.
+    :type width: int
+    :param height: The frame height.
+    :type height: int
+    :return: The frame.
+    :rtype: VideoFrame
+    """
+    data = bytearray(math.ceil(height * 12 / 8) * width)
+    y, c1, c2 = yuv_planes(data, width, height)
+    y.fill(BLACK_Y)
+    c1.fill(BLACK_UV)
+    c2.fill(BLACK_UV)
+    return VideoFrame(width=width, height=height, data=bytes(data))
+
+
+def yuv_planes(data, width, height):
+    """
+    Get views of the planes of a planar YUV 4:2:0 (YV12 or I420) image.
+
+    No data is copied, the views are writable if data is.
+
+    :param data: The image data.
+    :type data: bytes | bytearray | memoryview | numpy.ndarray
+    :param width: The image width, must be even.
+    :type width: int
+    :param height: The image height, must be even.
+    :type height: int
+    :return: The Y plane, and the two chroma planes in the order they are stored.
+    :rtype: tuple
+    """
+    flat = numpy.frombuffer(data, numpy.uint8)
+    y_size = width * height
+    c_width = width // 2
+    c_height = height // 2
+    c_size = c_width * c_height
+    return (
+        flat[:y_size].reshape((height, width)),
+        flat[y_size:y_size + c_size].reshape((c_height, c_width)),
+        flat[y_size + c_size:y_size + 2 * c_size].reshape((c_height, c_width)),
+    )
+
+
+class FrameCompositor:
+    """
+    Tiles frames side by side, directly in planar YUV 4:2:0.
+
+    The planes of each frame are copied in to their place in a frame of a
+    FramePool, so there is no color conversion and nothing is allocated.
+    Both chroma planes are laid out the same way, so YV12 and I420 frames
+    keep their format. Frames lower than the tallest frame are padded with black.
+    The pool is only reallocated when the frame sizes change.
+    """
+
+    def __init__(self, pool_size=FRAME_POOL_SIZE):
+        """
+        Initialize the FrameCompositor.
+
+        :param pool_size: The number of frames in the output FramePool.
+        :type pool_size: int
+        """
+        self.pool_size = pool_size
+        self.width = 0
+        self.height = 0
+        self._sizes = None
+        self._pool = None
+        self._tiles = dict()
+
+    def _allocate(self, sizes):
+        for width, height in sizes:
+            if width % 2 or height % 2:
+                raise ValueError(f"frame size must be even, got {width}x{height}")
+
+        self.width = sum(width for width, _ in sizes)
+        self.height = max(height for _, height in sizes)
+        self._pool = FramePool(self.width, self.height, self.pool_size)
+        self._tiles = dict()
+        for buffer in self._pool.buffers:
+            y, c1, c2 = yuv_planes(buffer, self.width, self.height)
+            y.fill(BLACK_Y)
+            c1.fill(BLACK_UV)
+            c2.fill(BLACK_UV)
+
+            tiles = []
+            x = 0
+            for width, height in sizes:
+                tiles.append((
+                    y[:height, x:x + width],
+                    c1[:height // 2, x // 2:(x + width) // 2],
+                    c2[:height // 2, x // 2:(x + width) // 2],
+                ))
+                x += width
+            self._tiles[id(buffer)] = tiles
+        self._sizes = sizes
+
+    def compose(self, frames):
+        """
+        Tile frames from left to right.
+
+        :param frames: The frames to tile.
+        :type frames: list
+        :return: The combined frame, it is reused after pool_size more frames.
+        :rtype: VideoFrame
+        """
+        sizes = [(frame.width, frame.height) for frame in frames]
+        if sizes != self._sizes:
+            self._allocate(sizes)
+
+        buffer, out = self._pool.next()
+        for frame, tile in zip(frames, self._tiles[id(buffer)]):
+            for dst, src in zip(tile, yuv_planes(frame.data, frame.width, frame.height)):
+                dst[...] = src
+        return out
+
+
+class MediaClock:
+    """
+    Paces frames at a steady rate.
+
+    Frames are due on a clock started at the first frame, so the time it
+    takes to make a frame does not add up to drift. A consumer that falls
+    more than max_lag behind skips frames, rather than receiving a burst of them.
+    """
+
+    def __init__(self, rate, max_lag):
+        """
+        Initialize the MediaClock.
+
+        :param rate: Frames per second.
+        :type rate: int | float
+        :param max_lag: Seconds to fall behind before skipping frames.
+        :type max_lag: int | float
+        """
+        self.rate = rate
+        self.max_lag = max_lag
+        self.index = 0
+        self._start = None
+
+    async def tick(self):
+        """
+        Wait until the next frame is due.
+
+        :return: The index of the frame, counted from the first frame.
+        :rtype: int
+        """
+        now = asyncio.get_event_loop().time()
+        if self._start is None:
+            self._start = now
+        else:
+            self.index += 1
+            delay = self._start + self.index / self.rate - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -self.max_lag:
+                self.index = int((now - self._start) * self.rate)
+        return self.index
+
+
+class PacedVideoStreamTrack(VideoStreamTrack):
+    """
+    Base class for video tracks that produce frames at a steady frame rate.
+
+    recv() waits until the next frame is due on a MediaClock, gets it from
+    next_frame() and stamps it with its pts and time base.
+
+    Subclasses increment `version` whenever the content of their frames
+    changes, so consumers can tell when a frame is the same as the last one.
+    """
+
+    def __init__(self, fps=VIDEO_FPS):
+        """
+        Initialize the PacedVideoStreamTrack.
+
+        :param fps: Frames per second.
+        :type fps: int | float
+        """
+        super().__init__()
+        self.fps = fps
+        self.version = 0
+        self._clock = MediaClock(fps, MAX_VIDEO_LAG)
+
+    async def next_frame(self):
+        """
+        Make the next frame, without pacing or stamping it.
+
+        :return: The frame.
+        :rtype: VideoFrame
+        """
+        raise NotImplementedError
+
+    async def recv(self):
+        index = await self._clock.tick()
+        frame = await self.next_frame()
+        frame.pts = frame.timestamp = int(index * VIDEO_CLOCK_RATE / self.fps)
+        frame.time_base = VIDEO_TIME_BASE
+        return frame
+
+
+def _next_frame(track):
+    if isinstance(track, PacedVideoStreamTrack):
+        return track.next_frame()
+    return track.recv()
+
+
+class ColorVideoStreamTrack(PacedVideoStreamTrack):
+    def __init__(self, width, height, color, fps=VIDEO_FPS):
+        super().__init__(fps)
+        data_bgr = numpy.zeros((height, width, 3), numpy.uint8)
+        data_bgr[:, :] = color
+        self.frame = frame_from_bgr(data_bgr=data_bgr)
+
+    async def next_frame(self):
+        return self.frame
+
+
+class CombinedVideoStreamTrack(PacedVideoStreamTrack):
+    """
+    Tiles the frames of several tracks side by side.
+
+    The tracks are paced by this track, rather than each by itself. While
+    none of them has changed, the last combined frame is sent again
+    instead of being rebuilt. Tracks that are not a PacedVideoStreamTrack
+    are assumed to change every frame.
+    """
+
+    def __init__(self, tracks, fps=VIDEO_FPS):
+        super().__init__(fps)
+        self.tracks = tracks
+        self._compositor = FrameCompositor()
+        self._frame = None
+        self._versions = None
+
+    async def next_frame(self):
+        frames = await asyncio.gather(*[_next_frame(track) for track in self.tracks])
+        versions = [getattr(track, "version", None) for track in self.tracks]
+        if self._frame is None or None in versions or versions != self._versions:
+            self._frame = self._compositor.compose(frames)
+            self._versions = versions
+            self.version += 1
+        return self._frame
+
+
+class DecodingVideoStreamTrack(PacedVideoStreamTrack):
+    """
+    Base class for tracks whose frames are decoded on a background thread.
+
+    The thread takes the frames from decode() and puts them on a bounded
+    queue, so decoding stays off the event loop and runs at most queue_size
+    frames ahead. Every frame is shown for `hold` frames. Until the first
+    frame is decoded, black frames are sent, and when decoding falls behind
+    or has finished, the last frame is sent again.
+
+    Subclasses implement decode(), which runs on the decoding thread, and
+    should fill their frames with _frame_from_bgr() so they come from the
+    track's FramePool.
+    """
+
+    def __init__(self, width, height, fps=VIDEO_FPS, repeat=True, queue_size=DECODE_QUEUE_SIZE):
+        """
+        Initialize the DecodingVideoStreamTrack.
+
+        :param width: The frame width, decoded images are resized to it.
+        :type width: int
+        :param height: The frame height, decoded images are resized to it.
+        :type height: int
+        :param fps: Frames per second.
+        :type fps: int | float
+        :param repeat: Start over when decode() is exhausted.
+        :type repeat: bool
+        :param queue_size: The maximum number of frames decoded ahead.
+        :type queue_size: int
+        """
+        super().__init__(fps)
+        self.width = width
+        self.height = height
+        self.repeat = repeat
+        self.hold = 1
+        self._queue = queue.Queue(queue_size)
+        # Frames on the queue, the one being sent and those held by the encoder.
+        self._pool = FramePool(width, height, queue_size + FRAME_POOL_SIZE)
+        self._resized = numpy.empty((height, width, 3), numpy.uint8)
+        self._frame = black_frame(width, height)
+        self._held = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Start decoding, this is done by the first recv() if not called before. """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"{type(self).__name__}-decoder", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """ Stop the track and the decoding thread. """
+        self._stopped.set()
+        parent_stop = getattr(super(), "stop", None)
+        if parent_stop is not None:
+            parent_stop()
+
+    def decode(self):
+        """
+        Decode the frames, this runs on the decoding thread.
+
+        :return: An iterable of frames.
+        """
+        raise NotImplementedError
+
+    def _frame_from_bgr(self, data_bgr):
+        """
+        Resize an image to the track size if needed, and convert it in to the next pool frame.
+
+        :param data_bgr: The image.
+        :type data_bgr: numpy.ndarray
+        :return: The frame.
+        :rtype: VideoFrame
+        """
+        if data_bgr.shape[:2] != (self.height, self.width):
+            data_bgr = cv2.resize(
+                data_bgr, (self.width, self.height), dst=self._resized, interpolation=cv2.INTER_AREA
+            )
+        return frame_from_bgr(data_bgr, self._pool)
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                count = 0
+                for frame in self.decode():
+                    if not self._put(frame):
+                        return
+                    count += 1
+                if not self.repeat or count == 0:
+                    return
+        except Exception as e:
+            log.error(f"{type(self).__name__}: decoding failed: {e}", exc_info=True)
+
+    def _put(self, frame):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(frame, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def next_frame(self):
+        self.start()
+        if self._held >= self.hold:
+            try:
+                self._frame = self._queue.get_nowait()
+                self._held = 0
+                self.version += 1
+            except queue.Empty:
+                pass
+        self._held += 1
+        return self._frame
+
+
+class FileVideoStreamTrack(DecodingVideoStreamTrack):
+    """ Plays a video file, or anything else OpenCV can capture from. """
+
+    def __init__(self, path, width=320, height=240, fps=VIDEO_FPS, repeat=True,
+                 queue_size=DECODE_QUEUE_SIZE):
+        """
+        Initialize the FileVideoStreamTrack.
+
+        Every decoded frame is sent once, so fps should match the frame rate of the video.
+
+        :param path: The path of the video file.
+        :type path: str
+        """
+        super().__init__(width, height, fps=fps, repeat=repeat, queue_size=queue_size)
+        self.path = path
+
+    def decode(self):
+        capture = cv2.VideoCapture(self.path)
+        if not capture.isOpened():
+            raise IOError(f"can not open video: {self.path}")
+        image = None
+        try:
+            while not self._stopped.is_set():
+                ok, image = capture.read(image)
+                if not ok:
+                    return
+                yield self._frame_from_bgr(image)
+        finally:
+            capture.release()
+
+
+class ImageSlideshowVideoStreamTrack(DecodingVideoStreamTrack):
+    """ Shows the images in a directory one after another, in file name order. """
+
+    def __init__(self, directory, width=320, height=240, interval=5, fps=VIDEO_FPS, repeat=True):
+        """
+        Initialize the ImageSlideshowVideoStreamTrack.
+
+        :param directory: The directory with the images.
+        :type directory: str
+        :param interval: Seconds each image is shown.
+        :type interval: int | float
+        """
+        # Only a couple of images need to be decoded ahead.
+        super().__init__(width, height, fps=fps, repeat=repeat, queue_size=2)
+        self.directory = directory
+        self.hold = max(1, round(interval * fps))
+
+    def decode(self):
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        for name in names:
+            image = cv2.imread(os.path.join(self.directory, name), cv2.IMREAD_COLOR)
+            if image is None:
+                log.warning(f"can not read image: {name}")
+                continue
+            yield self._frame_from_bgr(image)
+
+
+class RawVideoStreamTrack(PacedVideoStreamTrack):
+    """
+    Plays a raw planar YUV 4:2:0 file, e.g made with `ffmpeg -pix_fmt yuv420p -f rawvideo`.
+
+    The file is memory mapped, and YV12 frames are sent straight from the
+    mapping without decoding or copying. I420 files, which is what ffmpeg
+    writes for yuv420p, have their chroma planes swapped in to a pool frame.
+    """
+
+    def __init__(self, path, width, height, fps=VIDEO_FPS, pixel_format="i420", repeat=True):
+        """
+        Initialize the RawVideoStreamTrack.
+
+        :param path: The path of the raw video file.
+        :type path: str
+        :param width: The frame width.
+        :type width: int
+        :param height: The frame height.
+        :type height: int
+        :param pixel_format: The pixel format of the file, yv12 or i420.
+        :type pixel_format: str
+        :param repeat: Start over at the end of the file.
+        :type repeat: bool
+        """
+        super().__init__(fps)
+        if pixel_format not in ("yv12", "i420"):
+            raise ValueError(f"unsupported pixel format: {pixel_format}")
+        if width % 2 or height % 2:
+            raise ValueError(f"frame size must be even, got {width}x{height}")
+
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.repeat = repeat
+        self.frame_size = width * height * 3 // 2
+        self._data = memoryview(numpy.memmap(path, numpy.uint8, mode="r"))
+        self.frame_count = len(self._data) // self.frame_size
+        if self.frame_count == 0:
+            raise ValueError(f"{path} is smaller than one {width}x{height} frame")
+
+        self._pool = FramePool(width, height) if pixel_format == "i420" else None
+        self._position = 0
+        self._frame = None
+
+    def _read(self, position):
+        data = self._data[position * self.frame_size:(position + 1) * self.frame_size]
+        if self._pool is None:
+            return VideoFrame(width=self.width, height=self.height, data=data)
+
+        y, u, v = yuv_planes(data, self.width, self.height)
+        buffer, frame = self._pool.next()
+        _y, _v, _u = yuv_planes(buffer, self.width, self.height)
+        _y[...] = y
+        _v[...] = v
+        _u[...] = u
+        return frame
+
+    async def next_frame(self):
+        if self._position >= self.frame_count:
+            if not self.repeat:
+                return self._frame
+            self._position = 0
+        self._frame = self._read(self._position)
+        self._position += 1
+        self.version += 1
+        return self._frame
+
+
+class TestPatternVideoStreamTrack(PacedVideoStreamTrack):
+    """ Color bars, with a white bar moving across them unless moving is False. """
+
+    # Bar colors (BGR), from left to right.
+    BARS = (
+        (192, 192, 192), (0, 192, 192), (192, 192, 0), (0, 192, 0),
+        (192, 0, 192), (0, 0, 192), (192, 0, 0),
+    )
+    # Width, and pixels moved per frame, of the moving bar.
+    MARKER_WIDTH = 8
+    MARKER_STEP = 4
+
+    def __init__(self, width=320, height=240, fps=VIDEO_FPS, moving=True):
+        super().__init__(fps)
+        self.width = width
+        self.height = height
+        self.moving = moving
+        data_bgr = numpy.zeros((height, width, 3), numpy.uint8)
+        for i, color in enumerate(self.BARS):
+            data_bgr[:, i * width // len(self.BARS):(i + 1) * width // len(self.BARS)] = color
+        self._bars = cv2.cvtColor(data_bgr, cv2.COLOR_BGR2YUV_YV12)
+        self._pool = FramePool(width, height)
+        self._frame = None
+        self._marker = None
+        # Counted here rather than taken from the clock, a CombinedVideoStreamTrack
+        # calls next_frame without ticking the clock of this track.
+        self._count = 0
+
+    async def next_frame(self):
+        x = None
+        if self.moving:
+            x = (self._count * self.MARKER_STEP) % (self.width - self.MARKER_WIDTH) // 2 * 2
+            self._count += 1
+        if self._frame is not None and x == self._marker:
+            return self._frame
+
+        buffer, self._frame = self._pool.next()
+        numpy.copyto(buffer, self._bars)
+        if x is not None:
+            y, c1, c2 = yuv_planes(buffer, self.width, self.height)
+            y[:, x:x + self.MARKER_WIDTH] = 235
+            c1[:, x // 2:(x + self.MARKER_WIDTH) // 2] = BLACK_UV
+            c2[:, x // 2:(x + self.MARKER_WIDTH) // 2] = BLACK_UV
+        self._marker = x
+        self.version += 1
+        return self._frame
+
+
+class PacedAudioStreamTrack(AudioStreamTrack):
+    """
+    Base class for audio tracks that produce 16 bit PCM frames of AUDIO_PTIME seconds.
+
+    The frames are paced on a MediaClock and stamped with their pts in
+    samples. Their data is a memoryview of a ring of preallocated numpy
+    buffers, which subclasses fill in place with fill(), so sending
+    audio allocates no sample buffers.
+    """
+
+    def __init__(self, sample_rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS):
+        """
+        Initialize the PacedAudioStreamTrack.
+
+        :param sample_rate: Samples per second.
+        :type sample_rate: int
+        :param channels: The number of channels.
+        :type channels: int
+        """
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples = int(sample_rate * AUDIO_PTIME)
+        self.time_base = fractions.Fraction(1, sample_rate)
+        self._clock = MediaClock(1 / AUDIO_PTIME, MAX_AUDIO_LAG)
+        self._slots = []
+        for _ in range(FRAME_POOL_SIZE):
+            buffer = numpy.zeros((self.samples, channels), numpy.int16)
+            frame = AudioFrame(channels=channels, data=memoryview(buffer).cast("B"), sample_rate=sample_rate)
+            self._slots.append((buffer, frame))
+        self._slot = 0
+
+    def fill(self, buffer):
+        """
+        Write the samples of the next frame.
+
+        :param buffer: The (samples, channels) int16 buffer of the frame.
+        :type buffer: numpy.ndarray
+        """
+        raise NotImplementedError
+
+    async def recv(self):
+        index = await self._clock.tick()
+        buffer, frame = self._slots[self._slot]
+        self._slot = (self._slot + 1) % len(self._slots)
+        self.fill(buffer)
+        frame.pts = frame.timestamp = index * self.samples
+        frame.time_base = self.time_base
+        return frame
+
+
+class SilenceAudioStreamTrack(PacedAudioStreamTrack):
+    """ Silence. """
+
+    def fill(self, buffer):
+        # The buffers are zeroed when allocated, and never written.
+        pass
+
+
+class ToneAudioStreamTrack(PacedAudioStreamTrack):
+    """ A sine wave tone. """
+
+    def __init__(self, frequency=440, volume=0.3, sample_rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS):
+        """
+        Initialize the ToneAudioStreamTrack.
+
+        :param frequency: The frequency in Hz, rounded to a whole number.
+        :type frequency: int | float
+        :param volume: The volume, from 0 to 1.
+        :type volume: float
+        """
+        super().__init__(sample_rate, channels)
+        self.frequency = int(round(frequency))
+        # The wave repeats after this many samples, it is computed once
+        # with a frame of extra samples, so every frame is one slice of it.
+        self._period = sample_rate // math.gcd(sample_rate, self.frequency)
+        t = numpy.arange(self._period + self.samples)
+        self._wave = (numpy.sin(2 * math.pi * self.frequency * t / sample_rate) * volume * 32767).astype(
+            numpy.int16
+        )
+        self._position = 0
+
+    def fill(self, buffer):
+        buffer[...] = self._wave[self._position:self._position + self.samples, None]
+        self._position = (self._position + self.samples) % self._period
+
+
+class WavAudioStreamTrack(PacedAudioStreamTrack):
+    """
+    Plays a 16 bit PCM wav file.
+
+    The frames have the sample rate and channels of the file, the encoder
+    resamples them. The file is read in full when the track is created.
+    """
+
+    def __init__(self, path, repeat=True):
+        """
+        Initialize the WavAudioStreamTrack.
+
+        :param path: The path of the wav file.
+        :type path: str
+        :param repeat: Start over at the end of the file, else send silence.
+        :type repeat: bool
+        """
+        with wave.open(path, "rb") as f:
+            if f.getsampwidth() != 2:
+                raise ValueError(f"{path} is not 16 bit PCM")
+            channels = f.getnchannels()
+            sample_rate = f.getframerate()
+            data = f.readframes(f.getnframes())
+        super().__init__(sample_rate, channels)
+        self.path = path
+        self.repeat = repeat
+        self._pcm = numpy.frombuffer(data, numpy.int16).reshape((-1, channels))
+        self._position = 0
+
+    def fill(self, buffer):
+        filled = 0
+        while filled < self.samples:
+            if self._position >= len(self._pcm):
+                if not self.repeat or len(self._pcm) == 0:
+                    buffer[filled:] = 0
+                    return
+                self._position = 0
+            count = min(self.samples - filled, len(self._pcm) - self._position)
+            buffer[filled:filled + count] = self._pcm[self._position:self._position + count]
+            filled += count
+            self._position += count
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Outbound message queue module"""
+
+import asyncio
+import collections
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# Priorities, lower is sent first.
+CONTROL = 0
+MODERATION = 1
+CHAT = 2
+
+# Priority by message type, anything not listed is CHAT.
+PRIORITIES = {
+    "pong": CONTROL,
+    "join": CONTROL,
+    "captcha": CONTROL,
+    "password": CONTROL,
+    "sdp": CONTROL,
+    "getice": CONTROL,
+    "ban": MODERATION,
+    "unban": MODERATION,
+    "kick": MODERATION,
+    "banlist": MODERATION,
+    "stream_moder_allow": MODERATION,
+    "stream_moder_close": MODERATION,
+}
+
+# Requests that are dropped if an identical one is already waiting to be sent.
+COALESCE = ("banlist", "yut_playlist", "getice", "pong")
+
+
+class TokenBucket:
+    """ Token bucket rate limiter. """
+
+    def __init__(self, rate, burst):
+        """
+        Initialize the TokenBucket.
+
+        :param rate: Tokens added per second.
+        :type rate: int | float
+        :param burst: The maximum number of tokens.
+        :type burst: int
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def try_acquire(self):
+        """
+        Take a token if there is one.
+
+        :return: 0 if a token was taken, else the seconds until there is one.
+        :rtype: float
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+
+class OutboundQueue:
+    """
+    Prioritized, rate limited queue for the messages the client sends.
+
+    Control messages, such as pong, go out first and are not rate limited.
+    Moderation and chat messages share a token bucket, so bursts from bots
+    do not trip the server's flood limits. Identical requests such as
+    banlist are sent once, however many times they were queued while waiting.
+    """
+
+    def __init__(self, send, rate=3, burst=6, max_size=500):
+        """
+        Initialize the OutboundQueue.
+
+        :param send: Coroutine function that writes one payload to the websocket.
+        :param rate: Rate limited messages per second.
+        :type rate: int | float
+        :param burst: The maximum number of rate limited messages sent in a burst.
+        :type burst: int
+        :param max_size: The maximum number of queued messages before put waits.
+        :type max_size: int
+        """
+        self._send = send
+        self._bucket = TokenBucket(rate, burst)
+        self.max_size = max_size
+        self._queues = [collections.deque() for _ in (CONTROL, MODERATION, CHAT)]
+        self._pending_keys = set()
+        self._cond = None
+        self._control = None
+        self._task = None
+        self._in_flight = False
+        self.coalesced = 0
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues)
+
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """ Start the sender task. """
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+            self._control = asyncio.Event()
+        if not self.is_running:
+            self._task = asyncio.ensure_future(self._sender())
+
+    async def put(self, payload):
+        """
+        Queue a payload for sending.
+
+        Waits while the queue is full, control messages never wait.
+
+        :param payload: The payload to send.
+        :type payload: dict
+        """
+        tc = payload.get("tc")
+        priority = PRIORITIES.get(tc, CHAT)
+        key = None
+        if tc in COALESCE and len(payload) == 1:
+            key = tc
+            if key in self._pending_keys:
+                self.coalesced += 1
+                return
+
+        async with self._cond:
+            if priority != CONTROL:
+                await self._cond.wait_for(lambda: len(self) < self.max_size)
+            if key is not None:
+                if key in self._pending_keys:
+                    self.coalesced += 1
+                    return
+                self._pending_keys.add(key)
+            self._queues[priority].append((key, payload))
+            if priority == CONTROL:
+                self._control.set()
+            self._cond.notify_all()
+
+    async def close(self, drain=True, timeout=5.0):
+        """
+        Stop the sender task.
+
+        :param drain: Send the queued messages first, for at most timeout seconds.
+        :type drain: bool
+        :param timeout: Seconds to wait for the queue to drain.
+        :type timeout: int | float
+        """
+        if self.is_running and drain and (len(self) > 0 or self._in_flight):
+            try:
+                async with self._cond:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(lambda: len(self) == 0 and not self._in_flight), timeout
+                    )
+            except asyncio.TimeoutError:
+                log.warning(f"outbound queue not drained, dropping {len(self)} messages")
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for q in self._queues:
+            q.clear()
+        self._pending_keys.clear()
+
+    async def _next(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: len(self) > 0)
+            for priority, q in enumerate(self._queues):
+                if q:
+                    key, payload = q.popleft()
+                    if key is not None:
+                        self._pending_keys.discard(key)
+                    self._in_flight = True
+                    return priority, key, payload
+
+    async def _done(self):
+        async with self._cond:
+            self._in_flight = False
+            self._cond.notify_all()
+
+    async def _wait_token(self):
+        """
+        Wait for a token of the rate limiter.
+
+        :return: True if a token was taken, False if a control message came in first.
+        :rtype: bool
+        """
+        while True:
+            delay = self._bucket.try_acquire()
+            if delay == 0:
+                return True
+            if self._queues[CONTROL]:
+                return False
+            self._control.clear()
+            try:
+                await asyncio.wait_for(self._control.wait(), delay)
+                return False
+            except asyncio.TimeoutError:
+                pass
+
+    async def _sender(self):
+        while True:
+            priority, key, payload = await self._next()
+            if priority != CONTROL:
+                if not await self._wait_token():
+                    # A control message came in while waiting, it goes first.
+                    async with self._cond:
+                        self._queues[priority].appendleft((key, payload))
+                        if key is not None:
+                            self._pending_keys.add(key)
+                        self._in_flight = False
+                    continue
+            try:
+                await self._send(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"failed to send {payload.get('tc')}: {e}", exc_info=True)
+            await self._done()
@@ -43,7 +43,7 @@ class Account:
         """ Log out of tinychat. """
         _cookies = ["user", "pass", "hash"]
         for cookie in _cookies:
-            await util.web.delete_cookie(cookie)
+            util.web.delete_cookie(cookie)
 
     @staticmethod
     async def is_logged_in():
@@ -1,23 +1,25 @@
-import json
 import asyncio
-import traceback
+import random
+import re
 import logging
+import socket
 import time
+from urllib.parse import urlparse
 import websockets
-from aiortc import (RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, AudioStreamTrack,
+from aiortc import (RTCPeerConnection, RTCSessionDescription,
                     RTCIceGatherer, RTCIceTransport, RTCIceParameters, RTCIceServer, RTCConfiguration)
-from aiortc.mediastreams import VideoFrame
-import numpy
-import cv2
 from colorama import init, Fore, Style
 import config
 
 import apis.tinychat
 import user
 import handler
+import dispatcher
+import outbound
+from media import ColorVideoStreamTrack, CombinedVideoStreamTrack, BLUE, GREEN, RED
 
 from page import acc
-from util import string_util, captcha
+from util import string_util, captcha, codec, console, file_handler
 
 # Attempt to follow https://semver.org/
 __version__ = "0.2.2"
@@ -42,40 +44,10 @@ COLOR = {
     "bright_magenta": Style.BRIGHT + Fore.MAGENTA,
 }
 
-def frame_from_bgr(data_bgr):
-    data_yuv = cv2.cvtColor(data_bgr, cv2.COLOR_BGR2YUV_YV12)
-    return VideoFrame(width=data_bgr.shape[1], height=data_bgr.shape[0], data=data_yuv.tobytes())
-
-
-def frame_to_bgr(frame):
-    data_flat = numpy.frombuffer(frame.data, numpy.uint8)
-    data_yuv = data_flat.reshape((math.ceil(frame.height * 12 / 8), frame.width))
-    return cv2.cvtColor(data_yuv, cv2.COLOR_YUV2BGR_YV12)
-
-class ColorVideoStreamTrack(VideoStreamTrack):
-    def __init__(self, width, height, color):
-        data_bgr = numpy.zeros((height, width, 3), numpy.uint8)
-        data_bgr[:, :] = color
-        self.frame = frame_from_bgr(data_bgr=data_bgr)
-
-    async def recv(self):
-        return self.frame
-
-
-class CombinedVideoStreamTrack(VideoStreamTrack):
-    def __init__(self, tracks):
-        self.tracks = tracks
-
-    async def recv(self):
-        coros = [track.recv() for track in self.tracks]
-        frames = await asyncio.gather(*coros)
-        data_bgrs = [frame_to_bgr(frame) for frame in frames]
-        data_bgr = numpy.hstack(data_bgrs)
-        return frame_from_bgr(data_bgr)
-
-BLUE = (255, 0, 0)
-GREEN = (0, 255, 0)
-RED = (0, 0, 255)
+# Matches ban related system messages, e.g "nick was banned by mod"
+BAN_SYSMSG = re.compile(r"^(?P<nick>\S+) was (?P<unban>un)?banned")
+# Seconds to expect the system message of a ban sent by the client.
+PENDING_BAN_TTL = 60
 
 
 class TinychatRTCClient(object):
@@ -96,20 +68,56 @@ class TinychatRTCClient(object):
         self._init_time = time.time()
 
         self.handler = handler.Handler()
+        self.dispatcher = dispatcher.EventDispatcher(
+            self.handler,
+            workers=CONFIG.EVENT_WORKERS,
+            queue_size=CONFIG.EVENT_QUEUE_SIZE,
+        )
         self.is_green_room = False
         self.is_connected = False
-        self.active_user = None
         self.users = user.Users()
         # JSON string from tinychat.get_connect_info(), contains room token and ws address
         self.connect_info = {}
+        # Seconds spent in each connect stage, see connect().
+        self.connect_timings = {}
+        self._connect_start = None
+        self._join_sent = None
+        # Reconnect state, see run().
+        self.auto_reconnect = CONFIG.AUTO_RECONNECT
+        self.reconnect_count = 0
+        self._should_reconnect = False
+        self._is_resuming = False
         self._ws = None
+        self._codec = codec.get_codec(CONFIG.JSON_CODEC)
+        self._outbound = outbound.OutboundQueue(
+            self._send_now,
+            rate=CONFIG.SEND_RATE,
+            burst=CONFIG.SEND_BURST,
+            max_size=CONFIG.SEND_QUEUE_SIZE,
+        )
         self._req = 1
+        self._banlist_refresh = None
+        # Nicks the client sent a ban for, and until when its system message is expected.
+        self._pending_bans = {}
+        self._console = console.get_writer(CONFIG.CONSOLE_QUEUE_SIZE)
+        self._chat_log = None
+        if CONFIG.CHAT_LOGGING:
+            self._chat_log = file_handler.LogWriter(
+                f"{CONFIG.CONFIG_PATH}{room}/logs/",
+                max_bytes=CONFIG.CHAT_LOG_MAX_BYTES,
+                backup_count=CONFIG.CHAT_LOG_BACKUP_COUNT,
+                flush_interval=CONFIG.CHAT_LOG_FLUSH_INTERVAL,
+            )
         self.is_published = False
+        # The video track to broadcast, e.g a media.FileVideoStreamTrack. Color bars if None.
+        self.video_track = None
+        # The audio track to broadcast, e.g a media.WavAudioStreamTrack. No audio if None.
+        self.audio_track = None
         self.solve_captchas = solve_captchas
         self.ice_servers = None
         if solve_captchas:
             if len(CONFIG.API_KEY) > 0:
-                self.captcha = captcha.AntiCaptcha(CONFIG.API_KEY)
+                self.captcha = captcha.get_solver(CONFIG.API_KEY)
             else:
                 self.solve_captchas = False
     
@@ -117,27 +125,24 @@ class TinychatRTCClient(object):
         """
         Writes message to console.
 
+        The message is queued and written by a background thread,
+        so this never blocks the event loop.
+
         :param color: the colorama color representation.
         :param message: str the message to write.
         """
         if config.USE_24HOUR:
-            ts = time.strftime("%H:%M:%S")
+            ts = console.timestamp("%H:%M:%S")
         else:
-            ts = time.strftime("%I:%M:%S:%p")
+            ts = console.timestamp("%I:%M:%S:%p")
         if config.CONSOLE_COLORS:
             # TODO bit gross this
-            msg = f"{COLOR['white']}[{ts}]{Style.RESET_ALL}{color} {message}"
+            msg = f"{COLOR['white']}[{ts}]{Style.RESET_ALL}{color} {message}{Style.RESET_ALL}"
         else:
             msg = f"[{ts}] {message}"
-        try:
-            print(msg)
-        except UnicodeEncodeError as ue:
-            log.error(ue, exc_info=True)
-            if config.DEBUG_MODE:
-                traceback.print_exc()
-        # TODO
-        # if config.CHAT_LOGGING:
-        #    write_to_log('[' + ts + '] ' + message, self.room_name)
+        self._console.write(msg)
+        if self._chat_log is not None:
+            self._chat_log.write(f"[{ts}] {message}")
 
     async def login(self):
         """
@@ -154,6 +159,56 @@ class TinychatRTCClient(object):
             await account.login()
         return await account.is_logged_in()
 
+    async def run(self):
+        """
+        Connect, and keep reconnecting until disconnected on purpose.
+
+        Reconnects back off exponentially with full jitter, between
+        RECONNECT_BASE_DELAY and RECONNECT_MAX_DELAY. The room token is
+        fetched during the backoff, and the rtc version is cached, so the
+        reconnect itself is fast. Users and the banlist are resynced
+        rather than rebuilt, see on_joined and on_userlist_end.
+        """
+        attempt = 0
+        while True:
+            self._should_reconnect = self.auto_reconnect
+            connected_at = time.monotonic()
+            try:
+                await self.connect()
+            except (websockets.WebSocketException, OSError, asyncio.TimeoutError) as e:
+                log.error(f"connection error: {e}", exc_info=True)
+                self.is_connected = False
+
+            if not self._should_reconnect:
+                break
+            # A connection that stayed up for a while resets the backoff.
+            if time.monotonic() - connected_at > CONFIG.RECONNECT_MAX_DELAY:
+                attempt = 0
+            attempt += 1
+            if 0 < CONFIG.RECONNECT_MAX_ATTEMPTS < attempt:
+                self.console_write(COLOR["bright_red"], "Giving up reconnecting.")
+                break
+
+            delay = random.uniform(
+                0, min(CONFIG.RECONNECT_MAX_DELAY, CONFIG.RECONNECT_BASE_DELAY * 2 ** (attempt - 1))
+            )
+            self.console_write(
+                COLOR["bright_yellow"], f"Reconnecting in {delay:.1f}s (attempt {attempt})"
+            )
+            prefetch = max(0.0, delay - apis.tinychat.CONNECT_INFO_TTL / 2)
+            await asyncio.sleep(prefetch)
+            await asyncio.gather(
+                asyncio.sleep(delay - prefetch),
+                apis.tinychat.prewarm(
+                    [self.room_name], cache_file=CONFIG.RTC_VERSION_CACHE_FILE or None
+                ),
+            )
+            if not self._should_reconnect:
+                break
+            self.reconnect_count += 1
+            self._is_resuming = len(self.users.all) > 0
+        await self.close_chat_log()
+
     async def connect(self):
         tc_header = {
             "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64; rv:52.0) Gecko/20100101 Firefox/52.0",
@@ -162,22 +217,103 @@ class TinychatRTCClient(object):
             "Sec-WebSocket-Protocol": "tc",
             "Sec-WebSocket-Extensions": "permessage-deflate",
         }
-        # TODO probably move this to its own function?
-        self.connect_info = await apis.tinychat.get_connect_info(self.room_name)
+        self.connect_timings = {}
+        self._connect_start = time.perf_counter()
+        # The token and the rtc version don't depend on each other.
+        self.connect_info, rtc_version = await asyncio.gather(
+            self._timed("token", apis.tinychat.get_connect_info(self.room_name)),
+            self._timed("rtc_version", apis.tinychat.rtc_version(
+                self.room_name, cache_file=CONFIG.RTC_VERSION_CACHE_FILE or None
+            )),
+        )
+        if self.connect_info is None:
+            self.console_write(COLOR["bright_red"], "Failed to fetch the connect token.")
+            return
+
+        endpoint = urlparse(self.connect_info["endpoint"])
+        secure = endpoint.scheme == "wss"
+        addresses = await self._timed("dns", asyncio.get_event_loop().getaddrinfo(
+            endpoint.hostname, endpoint.port or (443 if secure else 80), type=socket.SOCK_STREAM
+        ))
+        # Connect to the resolved addresses, so the host is not resolved again.
+        sock = await self._timed("tcp", self._open_socket(addresses))
+        connect_kwargs = dict(sock=sock)
+        if secure:
+            connect_kwargs["server_hostname"] = endpoint.hostname
+        _ws_start = time.perf_counter()
         # TODO websockets debugging
         async with websockets.connect(
             self.connect_info["endpoint"],
             # TODO extra_headers=tc_header,
             origin="https://tinychat.com",
+            **connect_kwargs
         ) as self._ws:
+            # TLS and the websocket upgrade.
+            self.connect_timings["ws_handshake"] = time.perf_counter() - _ws_start
             if self._ws.open:
                 log.info(f"connecting to: {self.room_name}")
-                await self.send_join_msg()
+                self._outbound.start()
+                await self.send_join_msg(rtc_version)
                 self.is_connected = True
-                await self.__callback()
+                self.dispatcher.start()
+                try:
+                    await self.__callback()
+                finally:
+                    await self.dispatcher.stop()
+                    await self._outbound.close(drain=False)
+                    # The log stays open for the reconnect, it is closed by disconnect.
+                    await self.flush_chat_log()
+
+    @staticmethod
+    async def _open_socket(addresses):
+        """
+        Open a TCP connection to the first address that accepts one.
+
+        The addresses are tried in order, like loop.create_connection does,
+        so a host with a broken IPv6 address still connects over IPv4.
+
+        :param addresses: The results of loop.getaddrinfo.
+        :type addresses: list
+        :return: The connected socket.
+        :rtype: socket.socket
+        """
+        loop = asyncio.get_event_loop()
+        error = OSError("no addresses to connect to")
+        for family, type_, proto, _, address in addresses:
+            sock = socket.socket(family, type_, proto)
+            try:
+                sock.setblocking(False)
+                await asyncio.wait_for(loop.sock_connect(sock, address), CONFIG.CONNECT_TIMEOUT)
+                return sock
+            except (OSError, asyncio.TimeoutError) as e:
+                sock.close()
+                log.debug(f"connecting to {address} failed: {e!r}")
+                error = e
+            except BaseException:
+                sock.close()
+                raise
+        raise error
+
+    async def _timed(self, stage, coro):
+        """
+        Await a coroutine and record how long it took in connect_timings.
+
+        :param stage: The name of the connect stage.
+        :type stage: str
+        :param coro: The coroutine to await.
+        :return: The result of the coroutine.
+        """
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.connect_timings[stage] = time.perf_counter() - start
 
     async def disconnect(self):
         self.is_connected = False
+        self._should_reconnect = False
+        await self._outbound.close(drain=True)
+        await self.close_chat_log()
         await self._ws.close(reason="GoingAway")
         self._req = 1
         # TODO this works? don't think so
@@ -185,6 +321,18 @@ class TinychatRTCClient(object):
         if sockclosed:
             self._ws = None
 
+    async def flush_chat_log(self):
+        """ Write any buffered chat log lines. """
+        if self._chat_log is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._chat_log.flush)
+
+    async def close_chat_log(self):
+        """ Write any buffered chat log lines and close the log file, nothing is logged after this. """
+        if self._chat_log is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._chat_log.close)
+
     async def __callback(self):
         while self.is_connected:
             # I'm ok with this
@@ -198,10 +346,10 @@ class TinychatRTCClient(object):
                 except asyncio.TimeoutError:
                     break
             else:
-                json_data = json.loads(data)
-                log.debug(f"DATA: {data}")
+                json_data = self._codec.loads(data)
+                log.debug("DATA: %s", data)
                 event = json_data["tc"]
-                await self.handler.fire(self, event, json_data)
+                await self.dispatcher.dispatch(self, event, json_data)
 
     def description_to_dict(self, description):
         return {
@@ -238,12 +386,16 @@ class TinychatRTCClient(object):
         print(__ice.iceGatherer)
         print(gatherer.getLocalParameters())
         print(__ice.getRemoteCandidates())
-        local_video = CombinedVideoStreamTrack(tracks=[
-                    ColorVideoStreamTrack(width=width, height=height, color=BLUE),
-                    ColorVideoStreamTrack(width=width, height=height, color=GREEN),
-                    ColorVideoStreamTrack(width=width, height=height, color=RED),
-                    ])
+        local_video = self.video_track
+        if local_video is None:
+            local_video = CombinedVideoStreamTrack(tracks=[
+                        ColorVideoStreamTrack(width=width, height=height, color=BLUE),
+                        ColorVideoStreamTrack(width=width, height=height, color=GREEN),
+                        ColorVideoStreamTrack(width=width, height=height, color=RED),
+                        ])
         self.ice_env.addTrack(local_video)
+        if self.audio_track is not None:
+            self.ice_env.addTrack(self.audio_track)
         await self.ice_env.setLocalDescription(await self.ice_env.createOffer())
         print(self.ice_env.localDescription)
         payload = {
@@ -264,17 +416,19 @@ class TinychatRTCClient(object):
         """
         self.is_connected = False
         if code == 4:
+            self._should_reconnect = False
             self.console_write(
                 COLOR["bright_red"], "You have been banned from the room."
             )
         elif code == 5:
             self.console_write(COLOR["bright_red"], f"Reconnect code? {code}")
-            # TODO self.reconnect()
         elif code == 6:
+            self._should_reconnect = False
             self.console_write(COLOR["bright_red"], "Double account sign in.")
         elif code == 8:
             self.console_write(COLOR["bright_red"], f"Timeout error? {code}")
         elif code == 12:
+            self._should_reconnect = False
             self.console_write(
                 COLOR["bright_red"], "You have been kicked from the room."
             )
@@ -291,6 +445,17 @@ class TinychatRTCClient(object):
         :type client_info: dict
         """
         log.info(f"client info: {client_info}")
+        if self._join_sent is not None:
+            now = time.perf_counter()
+            self.connect_timings["join_ack"] = now - self._join_sent
+            self.connect_timings["total"] = now - self._connect_start
+            self._join_sent = None
+            log.info(f"connect timings: {self.connect_timings}")
+            if config.DEBUG_MODE:
+                timings = ", ".join(f"{k}: {v * 1000:.0f}ms" for k, v in self.connect_timings.items())
+                self.console_write(COLOR["white"], f"Time to joined: {timings}")
+        if self._is_resuming:
+            self.users.begin_resync()
         self.client_id = client_info["handle"]
         self.is_client_mod = client_info["mod"]
         self.is_client_owner = client_info["owner"]
@@ -368,6 +533,51 @@ class TinychatRTCClient(object):
                     COLOR["cyan"], f"Joins: {_user.nick}:{_user.id}"
                 )
 
+    async def on_userlist_many(self, user_infos):
+        """
+        Received upon joining a room, with all the users present in the room.
+
+        The users are added in one pass and a single summary line is written.
+        on_userlist is only called per user if a subclass overrides it.
+
+        :param user_infos: A list of user information.
+        :type user_infos: list
+        """
+        user_infos = [info for info in user_infos if info["handle"] != self.client_id]
+        users = self.users.add_many(user_infos)
+        mods = signed_in = lurkers = 0
+        for _user in users:
+            if _user.is_owner:
+                _user.user_level = 1
+                mods += 1
+            elif _user.is_mod:
+                _user.user_level = 3
+                mods += 1
+            if _user.account:
+                signed_in += 1
+            if _user.is_lurker:
+                lurkers += 1
+        self.console_write(
+            COLOR["bright_yellow"],
+            f"Userlist: {len(users)} users, {mods} moderators, "
+            f"{signed_in} signed in, {lurkers} lurkers.",
+        )
+
+        if type(self).on_userlist is not TinychatRTCClient.on_userlist:
+            for user_info in user_infos:
+                await self.on_userlist(user_info)
+        await self.on_userlist_end()
+
+    async def on_userlist_end(self):
+        """ Received after all the users of a userlist have been handled. """
+        if self._is_resuming:
+            self._is_resuming = False
+            removed = self.users.end_resync()
+            self.console_write(
+                COLOR["bright_green"],
+                f"Resumed with {len(self.users.all)} users, {len(removed)} left while away.",
+            )
+
     async def on_join(self, join_info):
         """
         Received when a user joins the room.
@@ -417,7 +627,7 @@ class TinychatRTCClient(object):
         """
         _user = self.users.search(uid)
         old_nick = _user.nick
-        _user.nick = nick
+        self.users.change_nick(uid, nick)
         self.console_write(
             COLOR["bright_cyan"], f"{old_nick}:{uid} Changed nick to: {nick}"
         )
@@ -478,12 +688,55 @@ class TinychatRTCClient(object):
         if not banlist_info["success"]:
             self.console_write(COLOR["bright_red"], banlist_info["reason"])
         else:
-            if len(banlist_info["items"]) > 0:
-                for item in banlist_info["items"]:
-                    self.users.add_banned_user(item)
-            else:
+            added, removed = self.users.sync_banlist(banlist_info["items"])
+            log.debug(f"banlist synced, added: {len(added)} removed: {len(removed)}")
+            if len(banlist_info["items"]) == 0:
                 self.console_write(COLOR["green"], "The banlist is empty.")
 
+    def sync_banlist_sysmsg(self, msg):
+        """
+        Apply a ban related system message to the banlist.
+
+        A ban the client sent itself is ignored, on_ban adds it. An unban the
+        banlist already reflects is ignored, and an unban of a single known ban
+        is applied directly. Anything else means the banlist has diverged from
+        the server's, and a refresh is requested. A nick that was banned
+        before may be banned again, so an existing ban of the nick does not
+        account for a ban message.
+
+        :param msg: The system message.
+        :type msg: str
+        """
+        match = BAN_SYSMSG.match(msg)
+        if match is not None:
+            nick = match.group("nick")
+            if match.group("unban"):
+                bans = self.users.search_banlist_all_by_nick(nick)
+                if len(bans) == 0:
+                    return
+                if len(bans) == 1:
+                    self.users.delete_banned_user({"id": bans[0].ban_id})
+                    return
+            else:
+                expires = self._pending_bans.pop(nick, None)
+                if expires is not None and expires >= time.monotonic():
+                    return
+        self.request_banlist_refresh()
+
+    def request_banlist_refresh(self):
+        """
+        Request the full banlist after the refresh window.
+
+        Requests made while a refresh is pending are coalesced in to it.
+        """
+        if self._banlist_refresh is None or self._banlist_refresh.done():
+            self._banlist_refresh = asyncio.ensure_future(self._refresh_banlist())
+
+    async def _refresh_banlist(self):
+        await asyncio.sleep(CONFIG.BANLIST_REFRESH_WINDOW)
+        if self.is_connected:
+            await self.send_banlist_msg()
+
     async def get_ice(self):
         payload = {
             'tc': 'getice'
@@ -500,25 +753,29 @@ class TinychatRTCClient(object):
         """
         ts = time.time()
         if uid != self.client_id:
-            self.active_user = self.users.search(uid)
-            await self.message_handler(msg)
+            # Messages from other users are handled concurrently,
+            # so the sender is passed along rather than kept on the client.
+            sender = self.users.search(uid)
+            await self.message_handler(sender, msg)
             if '?ice' in msg:
                 await self.get_ice()
             elif '?sdp' in msg:
                 await self.do_sdp_offer()
-            self.active_user.msg_time = ts
+            sender.msg_time = ts
 
-    async def message_handler(self, msg):
+    async def message_handler(self, sender, msg):
         """
         A basic handler for chat messages.
 
+        :param sender: The user that sent the message.
+        :type sender: user.User
         :param msg: The chat message.
         :type msg: str
         """
         # meh
         _msg = msg.replace("\n", " ")
         self.console_write(
-            COLOR["bright_green"], f"{self.active_user.nick}: {_msg}"
+            COLOR["bright_green"], f"{sender.nick}: {_msg}"
         )
 
     async def on_pvtmsg(self, uid, msg):
@@ -532,20 +789,22 @@ class TinychatRTCClient(object):
         """
         ts = time.time()
         if uid != self.client_id:
-            self.active_user = self.users.search(uid)
-            await self.private_message_handler(msg)
-            self.active_user.msg_time = ts
+            sender = self.users.search(uid)
+            await self.private_message_handler(sender, msg)
+            sender.msg_time = ts
 
-    async def private_message_handler(self, private_msg):
+    async def private_message_handler(self, sender, private_msg):
         """
         A basic handler for private messages.
 
+        :param sender: The user that sent the private message.
+        :type sender: user.User
         :param private_msg: The private message.
         :type private_msg: str
         """
         self.console_write(
             COLOR["green"],
-            f"Private message from {self.active_user.nick}: {private_msg}",
+            f"Private message from {sender.nick}: {private_msg}",
         )
 
     async def on_publish(self, uid):
@@ -555,8 +814,7 @@ class TinychatRTCClient(object):
         :param uid: The ID (handle) of the user broadcasting.
         :type uid: int
         """
-        _user = self.users.search(uid)
-        _user.is_broadcasting = True
+        _user = self.users.set_broadcasting(uid, True)
         if _user.is_waiting:
             _user.is_waiting = False
         self.console_write(
@@ -570,9 +828,8 @@ class TinychatRTCClient(object):
         :param uid: The ID (handle) of the user who stops broadcasting.
         :type uid: int
         """
-        _user = self.users.search(uid)
+        _user = self.users.set_broadcasting(uid, False)
         if _user is not None:
-            _user.is_broadcasting = False
             self.console_write(
                 COLOR["yellow"], f"{_user.nick}:{uid} stopped broadcasting."
             )
@@ -588,8 +845,7 @@ class TinychatRTCClient(object):
         """
         self.console_write(COLOR["white"], msg)
         if "banned" in msg and self.is_client_mod:
-            self.users.clear_banlist()  # eh
-            await self.send_banlist_msg()
+            self.sync_banlist_sysmsg(msg)
         if "green room enabled" in msg:
             self.is_green_room = True
         if "green room disabled" in msg:
@@ -655,23 +911,25 @@ class TinychatRTCClient(object):
         log.debug(f"captcha key: {key}")
         if self.solve_captchas:
             try:
-                solution = await self.captcha.solve_captcha(key, pageurl)
+                solution = await self.captcha.solve_captcha(
+                    key, f"https://tinychat.com/room/{self.room_name}"
+                )
             except BaseException as e:
-                await self.console_write(
+                self.console_write(
                     COLOR["bright_yellow"], f"reCAPTCHA solving error: {e}"
                 )
                 await self.disconnect()
             else:
                 if solution:
-                    await self.console_write(
+                    self.console_write(
                         COLOR["bright_yellow"], "reCAPTCHA solution received"
                     )
                     await self.send_captcha(solution)
-                    await self.console_write(
+                    self.console_write(
                         COLOR["bright_yellow"], "reCAPTCHA solution sent"
                     )
                 else:
-                    await self.console_write(
+                    self.console_write(
                         COLOR["bright_yellow"], "reCAPTCHA solving failure"
                     )
                     await self.disconnect()
@@ -758,18 +1016,23 @@ class TinychatRTCClient(object):
             f"The youtube ({yt_data['item']['id']}) was stopped.",
         )
 
-    async def send_join_msg(self):
+    async def send_join_msg(self, rtc_version=None):
         """
         The initial connect message to the room.
 
         The client sends this after the websocket handshake has been established.
 
+        :param rtc_version: The tinychat rtc version, fetched if not given.
+        :type rtc_version: str | None
         :return: Returns True if the connect message has been sent, else False.
         :rtype: bool
         """
         if not self.nickname:
             self.nickname = string_util.create_random_string(3, 20)
-        rtc_version = await apis.tinychat.rtc_version(self.room_name)
+        if rtc_version is None:
+            rtc_version = await apis.tinychat.rtc_version(
+                self.room_name, cache_file=CONFIG.RTC_VERSION_CACHE_FILE or None
+            )
         log.info(f"tinychat rtc version: {rtc_version}")
         if rtc_version is None:
             rtc_version = config.FALLBACK_RTC_VERSION
@@ -787,6 +1050,7 @@ class TinychatRTCClient(object):
                 "nick": self.nickname,
             }
             await self.send(payload)
+            self._join_sent = time.perf_counter()
             return True
         else:
             log.info(f"Token request failed\ntoken={token}")
@@ -837,6 +1101,13 @@ class TinychatRTCClient(object):
         :type uid: int
         """
         payload = {"tc": "ban", "handle": uid}
+        _user = self.users.search(uid)
+        if _user is not None:
+            now = time.monotonic()
+            self._pending_bans = {
+                nick: expires for nick, expires in self._pending_bans.items() if expires >= now
+            }
+            self._pending_bans[_user.nick] = now + PENDING_BAN_TTL
         await self.send(payload)
 
     async def send_unban_msg(self, ban_id):
@@ -1037,10 +1308,22 @@ class TinychatRTCClient(object):
         await self.send(payload)
 
     async def send(self, payload):
-        _payload = json.dumps(payload)
+        """
+        Queue a payload for sending, see outbound.OutboundQueue.
+
+        :param payload: The payload to send.
+        :type payload: dict
+        """
+        if self._outbound.is_running:
+            await self._outbound.put(payload)
+        else:
+            await self._send_now(payload)
+
+    async def _send_now(self, payload):
+        _payload = self._codec.dumps(payload)
         await self._ws.send(_payload)
         self._req += 1
-        log.debug(f"{_payload}")
+        log.debug("%s", _payload)
 
     def get_runtime(self, as_milli=False):
         """
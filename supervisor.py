@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Multi-process room sharding module"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from urllib.parse import urlparse, parse_qs
+
+import manager
+from util.hash_ring import HashRing
+
+log = logging.getLogger(__name__)
+
+# Seconds between metrics reports from the workers.
+METRICS_INTERVAL = 5
+# Seconds to wait before restarting a crashed worker, doubled for each crash in a row.
+RESTART_BASE_DELAY = 1
+RESTART_MAX_DELAY = 60
+# Seconds a restarted worker has to stay up before its crashes are forgotten.
+HEALTHY_UPTIME = 6 * METRICS_INTERVAL
+
+
+def _worker_main(worker_id, commands, results):
+    """
+    Entry point of a worker process, runs a RoomManager for the rooms it is sent.
+
+    :param worker_id: The ID of the worker.
+    :type worker_id: int
+    :param commands: Queue of (command, argument) tuples from the supervisor.
+    :type commands: multiprocessing.Queue
+    :param results: Queue the worker puts its metrics on.
+    :type results: multiprocessing.Queue
+    """
+
+    async def _commands(room_manager):
+        loop = asyncio.get_event_loop()
+        while True:
+            command, arg = await loop.run_in_executor(None, commands.get)
+            if command == "stop":
+                return
+            # A bad command must not take the other rooms of the worker down.
+            try:
+                if command == "join":
+                    room_manager.add_room(**manager.validate_room(arg))
+                elif command == "leave":
+                    await room_manager.remove_room(arg)
+            except Exception as e:
+                room = arg.get("room") if isinstance(arg, dict) else arg
+                log.error(f"worker {worker_id}: {command} {room} failed: {e}", exc_info=True)
+
+    async def _metrics(room_manager):
+        while True:
+            results.put((worker_id, os.getpid(), room_manager.metrics()))
+            await asyncio.sleep(METRICS_INTERVAL)
+
+    async def _main():
+        room_manager = manager.RoomManager()
+        await room_manager.start()
+        metrics_task = asyncio.ensure_future(_metrics(room_manager))
+        try:
+            await _commands(room_manager)
+        finally:
+            metrics_task.cancel()
+            await room_manager.stop()
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(_main())
+
+
+class Worker:
+    """ A worker process and its command queue. """
+
+    def __init__(self, worker_id, context, results):
+        self.worker_id = worker_id
+        self.commands = context.Queue()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(worker_id, self.commands, results),
+            name=f"pinylib-worker-{worker_id}",
+            daemon=True,
+        )
+        self.rooms = set()
+        self.crashes = 0
+        self.restart_at = None
+        self.started_at = None
+        self.metrics = {}
+
+    @property
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def send(self, command, arg=None):
+        self.commands.put((command, arg))
+
+
+class Supervisor:
+    """
+    Shards rooms over worker processes by consistent hashing.
+
+    Each worker runs a RoomManager on its own event loop, so the rooms are
+    spread over the CPU cores. When a worker exits, its rooms are handed to
+    the remaining workers until it has been restarted, after which the rooms
+    that hash to it move back. Aggregated metrics, and room control, are
+    available over a small HTTP endpoint.
+    """
+
+    def __init__(self, rooms, workers=None):
+        """
+        Initialize the Supervisor.
+
+        :param rooms: A list of room configs, see manager.load_rooms.
+        :type rooms: list
+        :param workers: The number of worker processes, default the number of CPU cores.
+        :type workers: int | None
+        """
+        rooms = [manager.validate_room(room_config) for room_config in rooms]
+        manager.check_accounts(rooms)
+        self.rooms = {room_config["room"]: room_config for room_config in rooms}
+        self.worker_count = workers or os.cpu_count() or 1
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._ring = HashRing()
+        self._workers = dict()
+        self._owners = dict()
+        self._is_running = False
+
+    def _spawn(self, worker_id):
+        worker = Worker(worker_id, self._context, self._results)
+        previous = self._workers.get(worker_id)
+        if previous is not None:
+            worker.crashes = previous.crashes
+        self._workers[worker_id] = worker
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        self._ring.add(worker_id)
+        log.info(f"started worker {worker_id} pid: {worker.process.pid}")
+
+    def _rebalance(self):
+        """ Move every room to the worker it currently hashes to. """
+        for room, room_config in self.rooms.items():
+            owner = self._ring.get(room)
+            current = self._owners.get(room)
+            if owner == current:
+                continue
+            if current is not None and current in self._workers and self._workers[current].is_alive:
+                self._workers[current].send("leave", room)
+                self._workers[current].rooms.discard(room)
+            if owner is None:
+                self._owners.pop(room, None)
+                continue
+            self._workers[owner].send("join", room_config)
+            self._workers[owner].rooms.add(room)
+            self._owners[room] = owner
+
+    def add_room(self, room_config):
+        """
+        Add a room and join it on the worker it hashes to.
+
+        :param room_config: The room config, see manager.load_rooms.
+        :type room_config: dict
+        """
+        room_config = manager.validate_room(room_config)
+        others = [c for room, c in self.rooms.items() if room != room_config["room"]]
+        manager.check_accounts(others + [room_config])
+        self.rooms[room_config["room"]] = room_config
+        self._rebalance()
+
+    def remove_room(self, room):
+        """
+        Leave a room and remove it.
+
+        :param room: The room name.
+        :type room: str
+        """
+        self.rooms.pop(room, None)
+        owner = self._owners.pop(room, None)
+        if owner is not None and self._workers[owner].is_alive:
+            self._workers[owner].send("leave", room)
+            self._workers[owner].rooms.discard(room)
+
+    def _check_workers(self):
+        now = time.monotonic()
+        changed = False
+        for worker_id, worker in self._workers.items():
+            if worker.restart_at is None and not worker.is_alive:
+                worker.crashes += 1
+                delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * 2 ** (worker.crashes - 1))
+                log.error(
+                    f"worker {worker_id} exited with code {worker.process.exitcode}, "
+                    f"restarting in {delay}s, moving rooms: {sorted(worker.rooms)}"
+                )
+                self._ring.remove(worker_id)
+                for room in worker.rooms:
+                    self._owners.pop(room, None)
+                worker.rooms.clear()
+                worker.metrics = {}
+                worker.restart_at = now + delay
+                changed = True
+            elif worker.restart_at is not None and worker.restart_at <= now:
+                self._spawn(worker_id)
+                changed = True
+            elif worker.is_alive and worker.crashes and worker.metrics:
+                # Reporting metrics, and up for a while, consider it healthy.
+                # The first report comes straight away, even from a crash looping worker.
+                if now - worker.started_at >= HEALTHY_UPTIME:
+                    worker.crashes = 0
+        if changed:
+            self._rebalance()
+
+    def _read_results(self):
+        while True:
+            try:
+                worker_id, pid, metrics = self._results.get_nowait()
+            except queue.Empty:
+                return
+            worker = self._workers.get(worker_id)
+            if worker is not None and worker.process.pid == pid:
+                worker.metrics = metrics
+
+    def metrics(self):
+        """
+        Aggregate the metrics of all the workers.
+
+        :return: A dictionary with totals, and per worker details under `workers`.
+        :rtype: dict
+        """
+        workers = dict()
+        for worker_id, worker in self._workers.items():
+            workers[worker_id] = {
+                "pid": worker.process.pid,
+                "alive": worker.is_alive,
+                "crashes": worker.crashes,
+                "rooms": sorted(worker.rooms),
+                "metrics": worker.metrics,
+            }
+        reports = [w.metrics for w in self._workers.values() if w.metrics]
+        connected = sum(m["rooms_connected"] for m in reports)
+        return {
+            "workers_total": len(workers),
+            "workers_alive": sum(1 for w in workers.values() if w["alive"]),
+            "rooms_total": len(self.rooms),
+            "rooms_connected": connected,
+            "healthy": connected == len(self.rooms),
+            "users": sum(m["users"] for m in reports),
+            "reconnects": sum(m["reconnects"] for m in reports),
+            "workers": workers,
+        }
+
+    async def _handle_http(self, reader, writer):
+        """ A minimal HTTP endpoint: /metrics, /join?room=name and /leave?room=name. """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            url = urlparse(request_line[1] if len(request_line) > 1 else "/")
+            params = parse_qs(url.query)
+            status = "200 OK"
+            if url.path == "/metrics":
+                body = self.metrics()
+            elif url.path == "/join" and "room" in params:
+                try:
+                    self.add_room({"room": params["room"][0]})
+                    body = {"joined": params["room"][0]}
+                except ValueError as e:
+                    status = "400 Bad Request"
+                    body = {"error": str(e)}
+            elif url.path == "/leave" and "room" in params:
+                self.remove_room(params["room"][0])
+                body = {"left": params["room"][0]}
+            else:
+                status = "404 Not Found"
+                body = {"error": "not found"}
+            data = json.dumps(body, default=str).encode("utf-8")
+            writer.write(
+                f"HTTP/1.0 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except (ConnectionError, IndexError) as e:
+            log.debug(f"control request error: {e}")
+        finally:
+            writer.close()
+
+    async def run(self, host="127.0.0.1", port=8089):
+        """
+        Start the workers and the control endpoint, and supervise until stopped.
+
+        :param host: The control endpoint host.
+        :type host: str
+        :param port: The control endpoint port.
+        :type port: int
+        """
+        self._is_running = True
+        for worker_id in range(self.worker_count):
+            self._spawn(worker_id)
+        self._rebalance()
+
+        server = await asyncio.start_server(self._handle_http, host, port)
+        log.info(f"control endpoint on http://{host}:{port}/metrics")
+        try:
+            while self._is_running:
+                self._read_results()
+                self._check_workers()
+                await asyncio.sleep(1)
+        finally:
+            server.close()
+            await server.wait_closed()
+            self.stop_workers()
+
+    def stop(self):
+        """ Stop supervising, the workers are stopped by run(). """
+        self._is_running = False
+
+    def stop_workers(self, timeout=10):
+        """
+        Stop all the worker processes.
+
+        :param timeout: Seconds to wait for each worker to exit, before terminating it.
+        :type timeout: int | float
+        """
+        for worker in self._workers.values():
+            if worker.is_alive:
+                worker.send("stop")
+        for worker in self._workers.values():
+            worker.process.join(timeout)
+            if worker.is_alive:
+                worker.process.terminate()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: supervisor.py rooms.json [workers]")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    _workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    _supervisor = Supervisor(manager.load_rooms(sys.argv[1]), workers=_workers)
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(_supervisor.run())
+    except KeyboardInterrupt:
+        _supervisor.stop_workers()
@@ -0,0 +1,60 @@
+import random
+import unittest
+
+import user
+
+
+def ban(ban_id, req_id=0, nick="guest"):
+    return {"id": ban_id, "nick": nick, "req": req_id, "username": "", "moderator": "mod"}
+
+
+class BanlistTest(unittest.TestCase):
+
+    def test_req_id_shared_by_bans(self):
+        users = user.Users()
+        for ban_id in (1, 2, 3):
+            users.add_banned_user(ban(ban_id, req_id=0))
+        self.assertEqual(users.search_banlist_by_req_id(0).ban_id, 1)
+
+        users.delete_banned_user({"id": 1})
+        self.assertEqual(users.search_banlist_by_req_id(0).ban_id, 2)
+        users.delete_banned_user({"id": 3})
+        self.assertEqual(users.search_banlist_by_req_id(0).ban_id, 2)
+        users.delete_banned_user({"id": 2})
+        self.assertIsNone(users.search_banlist_by_req_id(0))
+
+    def test_req_id_matches_linear_scan(self):
+        rng = random.Random(6)
+        users = user.Users()
+        for ban_id in range(1, 2000):
+            if users.banlist and rng.random() < 0.4:
+                users.delete_banned_user({"id": rng.choice(list(users.banlist))})
+            else:
+                users.add_banned_user(ban(ban_id, req_id=rng.randrange(5)))
+            for req_id in range(5):
+                expected = next(
+                    (b for b in users.banlist.values() if b.req_id == req_id), None
+                )
+                self.assertIs(users.search_banlist_by_req_id(req_id), expected)
+
+    def test_ban_id_heap_is_compacted(self):
+        users = user.Users()
+        for ban_id in range(1, 10001):
+            users.add_banned_user(ban(ban_id))
+            users.delete_banned_user({"id": ban_id - 1})
+        self.assertEqual(len(users.banlist), 1)
+        self.assertLess(len(users._ban_id_heap), 100)
+        self.assertEqual(users.last_banned.ban_id, 10000)
+
+    def test_last_banned_after_delete(self):
+        users = user.Users()
+        for ban_id in (5, 9, 7):
+            users.add_banned_user(ban(ban_id))
+        users.delete_banned_user({"id": 9})
+        self.assertEqual(users.last_banned.ban_id, 7)
+        users.clear_banlist()
+        self.assertIsNone(users.last_banned)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,35 +1,83 @@
+import heapq
 import time
 
+from util.nick_index import NickIndex
+
 
 class BannedUser:
     """ Class representing a banned user. """
 
+    __slots__ = ("ban_id", "nick", "req_id", "success", "account", "banned_by", "reason")
+
     def __init__(self, **kwargs):
-        self.ban_id = kwargs.get("id", 0)
-        self.nick = kwargs.get("nick", "")
-        self.req_id = kwargs.get("req", 0)
-        self.success = kwargs.get("success", False)
-        self.account = kwargs.get("username", "")
-        self.banned_by = kwargs.get("moderator", "")
-        self.reason = kwargs.get("reason", "")
+        self._load(kwargs)
+
+    @classmethod
+    def from_info(cls, ban_info):
+        """
+        Create a BannedUser from a ban or banlist item, without copying it in to kwargs.
+
+        :param ban_info: The banned user's ban information.
+        :type ban_info: dict
+        :return: A BannedUser.
+        :rtype: BannedUser
+        """
+        banned_user = cls.__new__(cls)
+        banned_user._load(ban_info)
+        return banned_user
+
+    def _load(self, ban_info):
+        get = ban_info.get
+        self.ban_id = get("id", 0)
+        self.nick = get("nick", "")
+        self.req_id = get("req", 0)
+        self.success = get("success", False)
+        self.account = get("username", "")
+        self.banned_by = get("moderator", "")
+        self.reason = get("reason", "")
 
 
 class User:
     """ Class representing a user. """
 
+    __slots__ = (
+        "id", "nick", "account", "giftpoints", "featured", "subscription", "session_id",
+        "achievement_url", "avatar", "is_lurker", "is_mod", "is_owner", "is_broadcasting",
+        "is_waiting", "user_level", "join_time", "tinychat_id", "last_login", "last_msg",
+        "msg_time",
+    )
+
     def __init__(self, **kwargs):
-        self.id = kwargs.get("handle")
-        self.nick = kwargs.get("nick", "")
-        self.account = kwargs.get("username", "")
-        self.giftpoints = kwargs.get("giftpoints", 0)
-        self.featured = kwargs.get("featured", False)
-        self.subscription = kwargs.get("subscription", 0)
-        self.session_id = kwargs.get("session_id", "")
-        self.achievement_url = kwargs.get("achievement_url", "")
-        self.avatar = kwargs.get("avatar", "")
-        self.is_lurker = kwargs.get("lurker", False)
-        self.is_mod = kwargs.get("mod", False)
-        self.is_owner = kwargs.get("owner", False)
+        self._load(kwargs)
+
+    @classmethod
+    def from_info(cls, user_info):
+        """
+        Create a User from a join or userlist item, without copying it in to kwargs.
+
+        :param user_info: User information data.
+        :type user_info: dict
+        :return: The user as User.
+        :rtype: User
+        """
+        user = cls.__new__(cls)
+        user._load(user_info)
+        return user
+
+    def _load(self, user_info):
+        get = user_info.get
+        self.id = get("handle")
+        self.nick = get("nick", "")
+        self.account = get("username", "")
+        self.giftpoints = get("giftpoints", 0)
+        self.featured = get("featured", False)
+        self.subscription = get("subscription", 0)
+        self.session_id = get("session_id", "")
+        self.achievement_url = get("achievement_url", "")
+        self.avatar = get("avatar", "")
+        self.is_lurker = get("lurker", False)
+        self.is_mod = get("mod", False)
+        self.is_owner = get("owner", False)
         self.is_broadcasting = False
         self.is_waiting = False
         #
@@ -49,9 +97,33 @@ class Users:
         Initialize the Users class.
 
         Creating a dictionary for users and one for banned users.
+
+        The users are also kept in secondary indexes by nick, account and role,
+        so lookups and role queries don't have to scan every user. The indexes
+        are updated by add, delete, change_nick and set_broadcasting.
         """
         self._users = dict()
         self._banned_users = dict()
+        # Secondary indexes.
+        self._nicks = dict()
+        self._accounts = dict()
+        self._mods = dict()
+        self._lurkers = dict()
+        self._norms = dict()
+        self._signed_in = dict()
+        self._broadcasters = dict()
+        # Banlist indexes.
+        self._banned_nicks = dict()
+        self._banned_accounts = dict()
+        self._banned_account_users = dict()
+        self._banned_req_ids = dict()
+        # Max-heap of ban IDs (negated), entries of unbanned users are dropped lazily.
+        self._ban_id_heap = []
+        # User IDs not yet seen again while resyncing after a reconnect.
+        self._stale = None
+        # Substring/prefix search indexes, keyed by user ID and ban ID.
+        self._nick_index = NickIndex()
+        self._banned_nick_index = NickIndex()
 
     @property
     def all(self):
@@ -71,11 +143,7 @@ class Users:
         :return: A list of moderator User.
         :rtype: list
         """
-        _mods = []
-        for user in self.all:
-            if self.all[user].is_mod:
-                _mods.append(self.all[user])
-        return _mods
+        return list(self._mods.values())
 
     @property
     def signed_in(self):
@@ -85,11 +153,7 @@ class Users:
         :return: A list of all the signed in User
         :rtype: list
         """
-        _signed_ins = []
-        for user in self.all:
-            if self.all[user].account:
-                _signed_ins.append(self.all[user])
-        return _signed_ins
+        return list(self._signed_in.values())
 
     @property
     def lurkers(self):
@@ -99,11 +163,7 @@ class Users:
         :return: A list of lurkers User.
         :rtype: list
         """
-        _lurkers = []
-        for user in self.all:
-            if self.all[user].is_lurker:
-                _lurkers.append(self.all[user])
-        return _lurkers
+        return list(self._lurkers.values())
 
     @property
     def norms(self):
@@ -113,11 +173,7 @@ class Users:
         :return: A list of all normal User.
         :rtype: list
         """
-        _regulars = []
-        for user in self.all:
-            if not self.all[user].is_mod and not self.all[user].is_lurker:
-                _regulars.append(self.all[user])
-        return _regulars
+        return list(self._norms.values())
 
     @property
     def broadcaster(self):
@@ -127,15 +183,72 @@ class Users:
         :return: A list of all the broadcasting User.
         :rtype: list
         """
-        _broadcasters = []
-        for user in self.all:
-            if self.all[user].is_broadcasting:
-                _broadcasters.append(self.all[user])
-        return _broadcasters
+        return list(self._broadcasters.values())
+
+    def _index(self, user):
+        """
+        Add a user to the secondary indexes.
+
+        :param user: The user to index.
+        :type user: User
+        """
+        self._nicks.setdefault(user.nick, dict())[user.id] = user
+        self._nick_index.add(user.id, user.nick)
+        if user.account:
+            self._accounts.setdefault(user.account, dict())[user.id] = user
+            self._signed_in[user.id] = user
+        self._index_roles(user)
+
+    def _index_roles(self, user):
+        """
+        Add a user to the role and broadcasting indexes.
+
+        :param user: The user to index.
+        :type user: User
+        """
+        if user.is_mod:
+            self._mods[user.id] = user
+        if user.is_lurker:
+            self._lurkers[user.id] = user
+        if not user.is_mod and not user.is_lurker:
+            self._norms[user.id] = user
+        if user.is_broadcasting:
+            self._broadcasters[user.id] = user
+
+    def _unindex(self, user):
+        """
+        Remove a user from the secondary indexes.
+
+        :param user: The user to remove.
+        :type user: User
+        """
+        self._unindex_nick(user)
+        self._nick_index.delete(user.id)
+        if user.account in self._accounts:
+            _handles = self._accounts[user.account]
+            _handles.pop(user.id, None)
+            if not _handles:
+                del self._accounts[user.account]
+        self._signed_in.pop(user.id, None)
+        self._unindex_roles(user)
+
+    def _unindex_roles(self, user):
+        for _index in (self._mods, self._lurkers, self._norms, self._broadcasters):
+            _index.pop(user.id, None)
+
+    def _unindex_nick(self, user):
+        _handles = self._nicks.get(user.nick)
+        if _handles is not None:
+            _handles.pop(user.id, None)
+            if not _handles:
+                del self._nicks[user.nick]
 
     def clear(self):
         """ Clear the user dictionary. """
         self._users.clear()
+        for _index in (self._nicks, self._accounts, self._signed_in, self._mods,
+                       self._lurkers, self._norms, self._broadcasters, self._nick_index):
+            _index.clear()
 
     def add(self, user_info):
         """
@@ -146,10 +259,89 @@ class Users:
         :return: The user as User.
         :rtype: User
         """
+        if self._stale is not None and user_info["handle"] in self._stale:
+            self._resync_user(user_info)
         if user_info["handle"] not in self.all:
-            self._users[user_info["handle"]] = User(**user_info)
+            _user = User.from_info(user_info)
+            self._users[user_info["handle"]] = _user
+            self._index(_user)
         return self.all[user_info["handle"]]
 
+    def add_many(self, user_infos):
+        """
+        Add several users to the user dictionary in one pass, e.g from a userlist.
+
+        :param user_infos: A list of user information data.
+        :type user_infos: list
+        :return: A list of the users as User.
+        :rtype: list
+        """
+        users = self._users
+        stale = self._stale
+        added = []
+        for user_info in user_infos:
+            handle_id = user_info["handle"]
+            if stale is not None and handle_id in stale:
+                self._resync_user(user_info)
+            _user = users.get(handle_id)
+            if _user is None:
+                _user = User.from_info(user_info)
+                users[handle_id] = _user
+                self._index(_user)
+            added.append(_user)
+        return added
+
+    def begin_resync(self):
+        """
+        Start resyncing the users with the server after a reconnect.
+
+        Users added again while resyncing keep their existing User object,
+        if the ID (handle) and account still match. Users that are not
+        added again are removed by end_resync.
+        """
+        self._stale = set(self._users)
+
+    def end_resync(self):
+        """
+        Finish resyncing, removing the users that are no longer in the room.
+
+        :return: A list of the removed User.
+        :rtype: list
+        """
+        if self._stale is None:
+            return []
+        removed = [self.delete(handle_id) for handle_id in self._stale]
+        self._stale = None
+        return [user for user in removed if user is not None]
+
+    def _resync_user(self, user_info):
+        """
+        Reuse or drop an existing User for user info received while resyncing.
+
+        :param user_info: User information data.
+        :type user_info: dict
+        """
+        handle_id = user_info["handle"]
+        self._stale.discard(handle_id)
+        user = self._users[handle_id]
+        if user.account != user_info.get("username", ""):
+            # The handle belongs to someone else now.
+            self.delete(handle_id)
+        else:
+            if user.nick != user_info.get("nick", ""):
+                self.change_nick(handle_id, user_info.get("nick", ""))
+            # The roles may have changed while away, and the broadcasts have ended.
+            self._unindex_roles(user)
+            was_mod = user.is_mod or user.is_owner
+            user.is_lurker = user_info.get("lurker", False)
+            user.is_mod = user_info.get("mod", False)
+            user.is_owner = user_info.get("owner", False)
+            user.is_broadcasting = False
+            if was_mod and not (user.is_mod or user.is_owner):
+                # Drop the moderator level given by the client.
+                user.user_level = 5
+            self._index_roles(user)
+
     def delete(self, handle_id):
         """
         Delete a user from the user dictionary.
@@ -162,9 +354,49 @@ class Users:
         if handle_id in self.all:
             user = self._users[handle_id]
             del self._users[handle_id]
+            self._unindex(user)
             return user
         return None
 
+    def change_nick(self, handle_id, nick):
+        """
+        Change the nick name of a user.
+
+        :param handle_id: The id (handle) of the user.
+        :type handle_id: int
+        :param nick: The new nick name.
+        :type nick: str
+        :return: The User or None if the ID was not found.
+        :rtype: User | None
+        """
+        user = self.search(handle_id)
+        if user is not None:
+            self._unindex_nick(user)
+            user.nick = nick
+            self._nicks.setdefault(nick, dict())[handle_id] = user
+            self._nick_index.add(handle_id, nick)
+        return user
+
+    def set_broadcasting(self, handle_id, is_broadcasting):
+        """
+        Set the broadcasting state of a user.
+
+        :param handle_id: The id (handle) of the user.
+        :type handle_id: int
+        :param is_broadcasting: True if the user is broadcasting.
+        :type is_broadcasting: bool
+        :return: The User or None if the ID was not found.
+        :rtype: User | None
+        """
+        user = self.search(handle_id)
+        if user is not None:
+            user.is_broadcasting = is_broadcasting
+            if is_broadcasting:
+                self._broadcasters[handle_id] = user
+            else:
+                self._broadcasters.pop(handle_id, None)
+        return user
+
     def search(self, handle_id):
         """
         Search the user dictionary by ID.
@@ -177,9 +409,7 @@ class Users:
         :return: The User or None if not found.
         :rtype: User | None
         """
-        if handle_id in self.all:
-            return self.all[handle_id]
-        return None
+        return self._users.get(handle_id)
 
     def search_by_nick(self, nick):
         """
@@ -190,25 +420,46 @@ class Users:
         :return: The User or None if not found.
         :rtype: User | None
         """
-        for user in self.all:
-            if self.all[user].nick == nick:
-                return self.all[user]
-        return None
+        _handles = self._nicks.get(nick)
+        if not _handles:
+            return None
+        if len(_handles) == 1:
+            return next(iter(_handles.values()))
+        # The nick is used more than once, return the first in user dictionary order.
+        return next(user for user in self._users.values() if user.id in _handles)
+
+    def search_by_account(self, account):
+        """
+        Search the user dictionary by account name.
 
-    def search_containing(self, contains):
+        The same account can be signed in more than once.
+
+        :param account: The account name to search for.
+        :type account: str
+        :return: A list of User signed in with the account.
+        :rtype: list
+        """
+        if account in self._accounts:
+            return list(self._accounts[account].values())
+        return []
+
+    def search_containing(self, contains, ignore_case=False, prefix=False):
         """
         Search the user dictionary for nick names matching the search string.
 
         :param contains: The search string to search for in the nick names.
         :type contains: str
+        :param ignore_case: Match regardless of case.
+        :type ignore_case: bool
+        :param prefix: Only match nick names starting with the search string.
+        :type prefix: bool
         :return: A list of User matching the search string.
         :rtype: list
         """
-        _users_containing = []
-        for user in self.all:
-            if str(contains) in self.all[user].nick:
-                _users_containing.append(self.all[user])
-        return _users_containing
+        return [
+            self._users[handle]
+            for handle in self._nick_index.search(contains, ignore_case, prefix)
+        ]
 
     # Banlist related.
     @staticmethod
@@ -231,6 +482,54 @@ class Users:
 
         return _user_obj
 
+    def _index_banned(self, banned_user):
+        """
+        Add a banned user to the banlist indexes.
+
+        :param banned_user: The banned user to index.
+        :type banned_user: BannedUser
+        """
+        ban_id = banned_user.ban_id
+        self._banned_nicks.setdefault(banned_user.nick, dict())[ban_id] = banned_user
+        if banned_user.account:
+            self._banned_accounts.setdefault(banned_user.account, dict())[ban_id] = banned_user
+            self._banned_account_users[ban_id] = banned_user
+        self._banned_req_ids.setdefault(banned_user.req_id, dict())[ban_id] = banned_user
+        heapq.heappush(self._ban_id_heap, -ban_id)
+        self._banned_nick_index.add(ban_id, banned_user.nick)
+
+    def _unindex_banned(self, banned_user):
+        """
+        Remove a banned user from the banlist indexes.
+
+        The ban ID heap entry is left in place, and skipped by last_banned,
+        until the stale entries outnumber the bans and the heap is rebuilt.
+
+        :param banned_user: The banned user to remove.
+        :type banned_user: BannedUser
+        """
+        ban_id = banned_user.ban_id
+        _bans = self._banned_nicks.get(banned_user.nick)
+        if _bans is not None:
+            _bans.pop(ban_id, None)
+            if not _bans:
+                del self._banned_nicks[banned_user.nick]
+        _bans = self._banned_accounts.get(banned_user.account)
+        if _bans is not None:
+            _bans.pop(ban_id, None)
+            if not _bans:
+                del self._banned_accounts[banned_user.account]
+        self._banned_account_users.pop(ban_id, None)
+        _bans = self._banned_req_ids.get(banned_user.req_id)
+        if _bans is not None:
+            _bans.pop(ban_id, None)
+            if not _bans:
+                del self._banned_req_ids[banned_user.req_id]
+        self._banned_nick_index.delete(ban_id)
+        if len(self._ban_id_heap) > 2 * len(self._banned_users) + 16:
+            self._ban_id_heap[:] = [-_ban_id for _ban_id in self._banned_users]
+            heapq.heapify(self._ban_id_heap)
+
     @property
     def banlist(self):
         """
@@ -249,10 +548,7 @@ class Users:
         :return: A list containing BannedUser objects.
         :rtype: list
         """
-        _banned_users = []
-        for banned_user in self.banlist:
-            _banned_users.append(self.banlist[banned_user])
-        return _banned_users
+        return list(self._banned_users.values())
 
     @property
     def banned_accounts(self):
@@ -262,11 +558,7 @@ class Users:
         :return: A list of BannedUser containing account name.
         :rtype: list
         """
-        _accounts = []
-        for ban_id in self.banlist:
-            if self.banlist[ban_id].account:
-                _accounts.append(self.banlist[ban_id])
-        return _accounts
+        return list(self._banned_account_users.values())
 
     @property
     def last_banned(self):
@@ -276,7 +568,12 @@ class Users:
         :return: The last BannedUser object from the banlist.
         :rtype: BannedUser | None
         """
-        return self._find_most_recent(self.banned_users)
+        _heap = self._ban_id_heap
+        while _heap and -_heap[0] not in self._banned_users:
+            heapq.heappop(_heap)
+        if _heap and -_heap[0] > 0:
+            return self._banned_users[-_heap[0]]
+        return None
 
     def add_banned_user(self, ban_info):
         """
@@ -290,7 +587,9 @@ class Users:
         # if not ban_info['id']:
         #     ban_info['id'] = 0
         if ban_info["id"] not in self.banlist:
-            self._banned_users[ban_info["id"]] = BannedUser(**ban_info)
+            banned_user = BannedUser.from_info(ban_info)
+            self._banned_users[ban_info["id"]] = banned_user
+            self._index_banned(banned_user)
         return self.banlist[ban_info["id"]]
 
     def delete_banned_user(
@@ -307,12 +606,43 @@ class Users:
         if ban_info["id"] in self.banlist:
             banned_user = self.banlist[ban_info["id"]]
             del self._banned_users[ban_info["id"]]
+            self._unindex_banned(banned_user)
             return banned_user
         return None
 
     def clear_banlist(self):
         """ Clear the ban list. """
         self._banned_users.clear()
+        self._banned_nicks.clear()
+        self._banned_accounts.clear()
+        self._banned_account_users.clear()
+        self._banned_req_ids.clear()
+        del self._ban_id_heap[:]
+        self._banned_nick_index.clear()
+
+    def sync_banlist(self, items):
+        """
+        Bring the banlist in line with a full banlist from the server.
+
+        Only the differences are applied, unchanged BannedUser objects are kept.
+
+        :param items: The banlist items from a banlist message.
+        :type items: list
+        :return: A tuple of the added and the removed BannedUser lists.
+        :rtype: tuple
+        """
+        _ids = {item["id"] for item in items}
+        removed = [
+            self.delete_banned_user({"id": ban_id})
+            for ban_id in list(self._banned_users)
+            if ban_id not in _ids
+        ]
+        added = [
+            self.add_banned_user(item)
+            for item in items
+            if item["id"] not in self._banned_users
+        ]
+        return added, removed
 
     def search_banlist(self, ban_id):
         """
@@ -323,9 +653,7 @@ class Users:
         :return: A BannedUser or None if not found.
         :rtype: BannedUser | None
         """
-        if ban_id in self.banlist:
-            return self.banlist[ban_id]
-        return None
+        return self._banned_users.get(ban_id)
 
     def search_banlist_by_nick(self, user_name):
         """
@@ -339,41 +667,77 @@ class Users:
         :return: A BannedUser object or None if no match was found in the banlist.
         :rtype: BannedUser | None
         """
-        _candidates = []
-        for ban_id in self.banlist:
-            if self.banlist[ban_id].nick == user_name:
-                _candidates.append(self.banlist[ban_id])
+        _candidates = self._banned_nicks.get(user_name)
+        if not _candidates:
+            return None
+
+        return self._find_most_recent(_candidates.values())
+
+    def search_banlist_all_by_nick(self, user_name):
+        """
+        Search the banlist for all bans of a username.
+
+        :param user_name: The user name of the banned user to search for.
+        :type user_name: str
+        :return: A list of BannedUser, oldest ban first.
+        :rtype: list
+        """
+        _candidates = self._banned_nicks.get(user_name)
+        if not _candidates:
+            return []
 
-        if len(_candidates) == 0:
+        return sorted(_candidates.values(), key=lambda banned_user: banned_user.ban_id)
+
+    def search_banlist_by_account(self, account):
+        """
+        Search the banlist for an account name.
+
+        If more than one ban matches the account,
+        then the most recent BannedUser object will be returned.
+
+        :param account: The account name to search for.
+        :type account: str
+        :return: A BannedUser object or None if no match was found in the banlist.
+        :rtype: BannedUser | None
+        """
+        _candidates = self._banned_accounts.get(account)
+        if not _candidates:
             return None
 
-        return self._find_most_recent(_candidates)
+        return self._find_most_recent(_candidates.values())
 
-    def search_banlist_containing(self, contains):
+    def search_banlist_containing(self, contains, ignore_case=False, prefix=False):
         """
         Search the banlist for user names matching the search str.
 
         :param contains: The search term to search for.
         :type contains: str
+        :param ignore_case: Match regardless of case.
+        :type ignore_case: bool
+        :param prefix: Only match user names starting with the search term.
+        :type prefix: bool
         :return: A list of matches.
         :rtype: list
         """
-        _banned_containing = []
-        for user in self.banlist:
-            if str(contains) in self.banlist[user].nick:
-                _banned_containing.append(self.banlist[user])
-        return _banned_containing
+        return [
+            self._banned_users[ban_id]
+            for ban_id in self._banned_nick_index.search(contains, ignore_case, prefix)
+        ]
 
     def search_banlist_by_req_id(self, req_id):
         """
         Search the banned user dictionary by req ID.
 
+        More than one ban can have the same req ID, then the first
+        one in the banlist is returned.
+
         :param req_id: The req ID to search for.
         :type req_id: int
         :return: A BannedUser matching the req ID or None if not found.
         :rtype: BannedUser | None
         """
-        for ban_id in self.banlist:
-            if self.banlist[ban_id].req_id == req_id:
-                return self.banlist[ban_id]
-        return None
+        _candidates = self._banned_req_ids.get(req_id)
+        if not _candidates:
+            return None
+
+        return next(iter(_candidates.values()))
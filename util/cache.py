@@ -0,0 +1,124 @@
+""" In memory caches and request de-duplication. """
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A dictionary like cache where entries expire after a time to live.
+
+    When maxsize is set, the least recently used entry is evicted to make room.
+    Expired entries stay available through get_stale until evicted or
+    overwritten, e.g to fall back on a last known good value.
+    """
+
+    def __init__(self, ttl=60, maxsize=None):
+        """
+        Initialize the cache.
+
+        :param ttl: Default seconds an entry stays fresh.
+        :type ttl: int | float
+        :param maxsize: The maximum number of entries, None for no limit.
+        :type maxsize: int | None
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        """
+        Get a fresh entry.
+
+        :param key: The key of the entry.
+        :param default: Returned if there is no fresh entry.
+        :return: The cached value or default.
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def get_stale(self, key, default=None):
+        """
+        Get an entry, whether it has expired or not.
+
+        :param key: The key of the entry.
+        :param default: Returned if there is no entry.
+        :return: The cached value or default.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        Add or replace an entry.
+
+        :param key: The key of the entry.
+        :param value: The value to cache.
+        :param ttl: Seconds the entry stays fresh, default is the cache ttl.
+        :type ttl: int | float | None
+        """
+        if ttl is None:
+            ttl = self.ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove an entry.
+
+        :param key: The key of the entry.
+        """
+        self._data.pop(key, None)
+
+    def clear(self):
+        """ Remove all entries. """
+        self._data.clear()
+
+
+class SingleFlight:
+    """
+    De-duplicates concurrent calls.
+
+    While a call for a key is in flight, later calls for the same key
+    wait on the first call's result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    @property
+    def in_flight(self):
+        """ The number of calls in flight. """
+        return len(self._calls)
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Call a coroutine function, or join the call already in flight for the key.
+
+        :param key: The de-duplication key.
+        :param func: The coroutine function to call.
+        :return: The result of the call.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shielded, so one caller being cancelled does not cancel the call for the others.
+        return await asyncio.shield(future)
@@ -8,43 +8,140 @@ import aiohttp
 import json
 import time
 
-# I couldn't force myself to use utl.web - sorry 
-async def post_request(url, data=None, json=None, timeout=180):
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(
-                url, data=data, json=json, timeout=timeout
-            ) as r:
-                return await r.text()
-        except BaseException as e:
-            raise e
+# Solvers by api key, shared by all the rooms.
+_solvers = {}
 
 
-async def get_request(url, data=None, json=None, timeout=180):
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(
-                url, data=data, json=json, timeout=timeout
-            ) as r:
-                return await r.text()
-        except BaseException as e:
-            raise e
+# I couldn't force myself to use utl.web - sorry
+async def post_request(url, data=None, json=None, timeout=180, session=None):
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await post_request(url, data, json, timeout, session)
+    async with session.post(
+        url, data=data, json=json, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as r:
+        return await r.text()
+
+
+async def get_request(url, data=None, json=None, timeout=180, session=None):
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await get_request(url, data, json, timeout, session)
+    async with session.get(
+        url, data=data, json=json, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as r:
+        return await r.text()
+
+
+def get_solver(api_key):
+    """
+    Get the shared AntiCaptcha instance for an api key.
+
+    :param api_key: The Anti-Captcha api key.
+    :type api_key: str
+    :return: The AntiCaptcha instance.
+    :rtype: AntiCaptcha
+    """
+    if api_key not in _solvers or _solvers[api_key].is_closed:
+        _solvers[api_key] = AntiCaptcha(api_key)
+    return _solvers[api_key]
+
+
+async def close_solvers():
+    """ Close the sessions of all the shared AntiCaptcha instances. """
+    for solver in list(_solvers.values()):
+        await solver.close()
+    _solvers.clear()
 
 
 class AntiCaptcha(object):
-    def __init__(self, api_key):
-        self.api_url = "http://api.anti-captcha.com/"
+    """
+    Anti-Captcha api client.
+
+    All requests go through one long-lived session, so the connection
+    is reused across polls, and across rooms sharing the instance.
+    Call close() (or use as async context manager) when done.
+
+    Outstanding tasks are polled by a single poller task. Each tick it
+    checks every task that is due concurrently, so many captchas being
+    solved at once cost a few batched rounds of status checks. The first
+    poll of a task is timed from the average solve time seen so far, and
+    later polls back off from min_delay up to max_delay. A failed poll is
+    retried, a task fails after max_poll_errors failed polls in a row.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        api_url="http://api.anti-captcha.com/",
+        min_delay=2.0,
+        max_delay=10.0,
+        backoff=1.5,
+        max_concurrent_polls=8,
+        max_poll_errors=3,
+    ):
+        self.api_url = api_url.rstrip("/")
         self.api_key = api_key
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_concurrent_polls = max_concurrent_polls
+        self.max_poll_errors = max_poll_errors
+        # Typical solve time to start with, refined as tasks complete.
+        self.avg_solve_time = 15.0
+        self._session = None
+        self._pending = {}
+        self._wakeup = None
+        self._poller = None
+        self.is_closed = False
 
-    async def get_balance(self):
-        fields = {"clientKey": self.api_key}
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=4, keepalive_timeout=60)
+            )
+            self.is_closed = False
+        return self._session
+
+    @property
+    def pending(self):
+        """ The number of tasks waiting for a solution. """
+        return len(self._pending)
+
+    async def close(self):
+        """ Stop polling, and close the session and its connections. """
+        self.is_closed = True
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        for task in self._pending.values():
+            if not task["future"].done():
+                task["future"].cancel()
+        self._pending.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _call(self, method, payload):
         response = await post_request(
-            f"{self.api_url}/getBalance", json=fields
+            f"{self.api_url}/{method}", json=payload, session=self.session
         )
-        errorId = int(response["errorId"])
-        if errorId > 1:
+        return json.loads(response)
+
+    async def get_balance(self):
+        fields = {"clientKey": self.api_key}
+        j = await self._call("getBalance", fields)
+        errorId = int(j["errorId"])
+        if errorId > 0:
             return
-        balance = response["balance"]
+        balance = j["balance"]
         return balance
 
     async def solve_captcha(self, sitekey, pageurl):
@@ -58,26 +155,81 @@ class AntiCaptcha(object):
             "softId": 0,
             "languagePool": "en",
         }
-        response = await post_request(
-            f"{self.api_url}/createTask", json=payload
-        )
-        j = json.loads(response)
+        j = await self._call("createTask", payload)
         errorId = int(j["errorId"])
-        if errorId > 1:
+        if errorId > 0:
             return
         taskId = j["taskId"]
-        payload = {"clientKey": self.api_key, "taskId": taskId}
-        await asyncio.sleep(10)
-        while 1:
-            response = await post_request(
-                f"{self.api_url}/getTaskResult", json=payload
-            )
-            j = json.loads(response)
-            if j["status"] == "processing":
-                await asyncio.sleep(5)
-            elif errorId > 1:
+
+        now = time.monotonic()
+        future = asyncio.get_event_loop().create_future()
+        self._pending[taskId] = {
+            "future": future,
+            "created": now,
+            "next_poll": now + max(self.min_delay, self.avg_solve_time * 0.8),
+            "delay": self.min_delay,
+            "errors": 0,
+        }
+        self._wake_poller()
+        try:
+            return await future
+        finally:
+            self._pending.pop(taskId, None)
+
+    def _wake_poller(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll_loop())
+
+    async def _poll_loop(self):
+        semaphore = asyncio.Semaphore(self.max_concurrent_polls)
+        while self._pending:
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = [task_id for task_id, task in self._pending.items() if task["next_poll"] <= now]
+            if due:
+                await asyncio.gather(*(self._check_task(task_id, semaphore) for task_id in due))
+                continue
+
+            wait = min(task["next_poll"] for task in self._pending.values()) - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check_task(self, task_id, semaphore):
+        task = self._pending.get(task_id)
+        if task is None or task["future"].done():
+            return
+        payload = {"clientKey": self.api_key, "taskId": task_id}
+        try:
+            async with semaphore:
+                j = await self._call("getTaskResult", payload)
+        except Exception as e:
+            task["errors"] += 1
+            if task["errors"] < self.max_poll_errors:
+                # Likely transient, poll again after the current delay.
+                task["next_poll"] = time.monotonic() + task["delay"]
                 return
-            else:
-                break
-            await asyncio.sleep(1)
-        return j["solution"]["gRecaptchaResponse"]
+            if not task["future"].done():
+                task["future"].set_exception(e)
+            self._pending.pop(task_id, None)
+            return
+
+        task["errors"] = 0
+        if int(j.get("errorId", 0)) > 0:
+            result = None
+        elif j["status"] == "processing":
+            task["next_poll"] = time.monotonic() + task["delay"]
+            task["delay"] = min(self.max_delay, task["delay"] * self.backoff)
+            return
+        else:
+            result = j["solution"]["gRecaptchaResponse"]
+            solve_time = time.monotonic() - task["created"]
+            self.avg_solve_time = self.avg_solve_time * 0.8 + solve_time * 0.2
+
+        self._pending.pop(task_id, None)
+        if not task["future"].done():
+            task["future"].set_result(result)
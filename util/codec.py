@@ -0,0 +1,99 @@
+""" JSON codecs for the websocket receive and send paths. """
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec:
+    """ Standard library codec, always available. """
+
+    name = "json"
+
+    @staticmethod
+    def loads(data):
+        """
+        Decode a websocket frame.
+
+        :param data: The frame, json.loads accepts str as well as bytes.
+        :type data: str | bytes
+        :return: The decoded object.
+        """
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        """
+        Encode a payload as a text frame.
+
+        :param obj: The payload to encode.
+        :return: The compact json str.
+        :rtype: str
+        """
+        return json.dumps(obj, separators=(",", ":"))
+
+
+class UJsonCodec(JsonCodec):
+    """ Codec using ujson. """
+
+    name = "ujson"
+
+    @staticmethod
+    def loads(data):
+        return ujson.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False)
+
+
+class OrJsonCodec(JsonCodec):
+    """ Codec using orjson, decodes str and bytes without an extra copy. """
+
+    name = "orjson"
+
+    @staticmethod
+    def loads(data):
+        return orjson.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        # orjson returns bytes, the server expects text frames.
+        return orjson.dumps(obj).decode()
+
+
+_CODECS = {"orjson": OrJsonCodec, "ujson": UJsonCodec, "json": JsonCodec}
+_AVAILABLE = {"orjson": orjson is not None, "ujson": ujson is not None, "json": True}
+
+
+def get_codec(name="auto"):
+    """
+    Get a JSON codec by name.
+
+    :param name: One of auto, orjson, ujson or json. auto picks the fastest installed codec.
+    :type name: str
+    :return: The codec class.
+    :rtype: JsonCodec
+    """
+    if name == "auto":
+        for _name in ("orjson", "ujson", "json"):
+            if _AVAILABLE[_name]:
+                return _CODECS[_name]
+
+    if name not in _CODECS:
+        raise ValueError(f"unknown json codec: {name}")
+
+    if not _AVAILABLE[name]:
+        log.warning(f"json codec {name} is not installed, using json")
+        return JsonCodec
+    return _CODECS[name]
@@ -0,0 +1,138 @@
+""" Non-blocking, batched console output. """
+import atexit
+import collections
+import logging
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+_writer = None
+_timestamp_cache = (None, None, "")
+
+
+def timestamp(fmt):
+    """
+    Format the current time, reusing the formatted str within the same second.
+
+    :param fmt: The time.strftime format.
+    :type fmt: str
+    :return: The formatted time.
+    :rtype: str
+    """
+    global _timestamp_cache
+    now = int(time.time())
+    if _timestamp_cache[0] != now or _timestamp_cache[1] != fmt:
+        _timestamp_cache = (now, fmt, time.strftime(fmt, time.localtime(now)))
+    return _timestamp_cache[2]
+
+
+class ConsoleWriter:
+    """
+    Writes lines to a stream from a background thread.
+
+    write() only appends to a queue, so the caller never waits on terminal I/O.
+    The thread writes everything queued in one batch, then waits flush_interval
+    before the next batch. Lines written while the queue is full are dropped,
+    and the number of dropped lines is reported in the output instead.
+    """
+
+    def __init__(self, stream=None, max_lines=10000, flush_interval=0.05):
+        """
+        Initialize the ConsoleWriter.
+
+        :param stream: The stream to write to, default sys.stdout.
+        :param max_lines: The maximum number of queued lines.
+        :type max_lines: int
+        :param flush_interval: Seconds to wait between batches.
+        :type flush_interval: float
+        """
+        self.stream = stream
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._dropped_pending = 0
+        self._lines = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="console-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """
+        Queue a line for writing.
+
+        :param line: The line to write, without a line ending.
+        :type line: str
+        :return: False if the line was dropped, else True.
+        :rtype: bool
+        """
+        with self._cond:
+            if self._closed or len(self._lines) >= self.max_lines:
+                self.dropped += 1
+                self._dropped_pending += 1
+                return False
+            self._lines.append(line)
+            if len(self._lines) == 1:
+                self._cond.notify()
+        return True
+
+    def close(self, timeout=2.0):
+        """
+        Write any queued lines and stop the writer thread.
+
+        :param timeout: Seconds to wait for the queue to be written.
+        :type timeout: float
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._lines and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._lines:
+                    return
+                batch = list(self._lines)
+                self._lines.clear()
+                dropped = self._dropped_pending
+                self._dropped_pending = 0
+
+            if dropped:
+                batch.append(f"[console overloaded, {dropped} lines dropped]")
+            self._write_batch(batch)
+            time.sleep(self.flush_interval)
+
+    def _write_batch(self, batch):
+        stream = self.stream or sys.stdout
+        try:
+            try:
+                stream.write("\n".join(batch) + "\n")
+            except UnicodeEncodeError as ue:
+                log.error(ue, exc_info=True)
+                encoding = getattr(stream, "encoding", None) or "ascii"
+                for line in batch:
+                    stream.write(line.encode(encoding, errors="replace").decode(encoding) + "\n")
+            stream.flush()
+        except (OSError, ValueError) as e:
+            log.error(f"console write error: {e}")
+
+
+def get_writer(max_lines=10000):
+    """
+    Get the process wide ConsoleWriter, creating it on first use.
+
+    :param max_lines: The maximum number of queued lines, used on creation.
+    :type max_lines: int
+    :return: The ConsoleWriter.
+    :rtype: ConsoleWriter
+    """
+    global _writer
+    if _writer is None:
+        _writer = ConsoleWriter(max_lines=max_lines)
+        atexit.register(_writer.close)
+    return _writer
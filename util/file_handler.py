@@ -1,6 +1,8 @@
 """ Handles operation related to files. """
 import os
 import logging
+import threading
+import time
 
 log = logging.getLogger(__name__)
 
@@ -84,3 +86,153 @@ def remove_from_file(file_path, file_name, remove):
             return True
         return False
     return False
+
+
+class LogWriter:
+    """
+    Buffered, rotating log file writer.
+
+    The file handle is kept open, and lines are buffered and written by a
+    background thread once flush_size bytes are buffered or flush_interval
+    seconds have passed. Log files are named by date, so a new file is started
+    every day, and a file reaching max_bytes is rotated to name.1, name.2 and so on,
+    keeping at most backup_count rotated files.
+    """
+
+    def __init__(self, file_path, max_bytes=5242880, backup_count=5, flush_size=16384, flush_interval=2.0):
+        """
+        Initialize the LogWriter.
+
+        :param file_path: str the path to the log folder.
+        :param max_bytes: int the size at which a log file is rotated, 0 for no size rotation.
+        :param backup_count: int the number of rotated files to keep, 0 to keep none.
+        :param flush_size: int the number of buffered bytes that triggers a write.
+        :param flush_interval: float the maximum seconds a line stays buffered.
+        """
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffered = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._flushing = False
+        self._writing = False
+        self._file = None
+        self._file_name = None
+
+    def write(self, line):
+        """
+        Buffer a line for writing.
+
+        Lines written after close are dropped.
+
+        :param line: str the line to write, without a line ending.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._buffer.append(line + "\n")
+            self._buffered += len(line) + 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+            elif self._buffered >= self.flush_size:
+                self._cond.notify()
+
+    def flush(self, timeout=5.0):
+        """
+        Write all buffered lines, and keep the log file open.
+
+        :param timeout: float seconds to wait for the buffered lines to be written.
+        """
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                return
+            self._flushing = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._buffer and not self._writing, timeout)
+
+    def close(self, timeout=5.0):
+        """
+        Write all buffered lines and close the log file.
+
+        The writer can not be used again, later lines are dropped.
+
+        :param timeout: float seconds to wait for the buffered lines to be written.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not (self._closed or self._flushing) and self._buffered < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+                batch = self._buffer
+                closed = self._closed
+                self._buffer = []
+                self._buffered = 0
+                self._flushing = False
+                self._writing = True
+
+            if batch:
+                self._write_batch("".join(batch))
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+                # Nothing is buffered after close, every line was in this batch.
+                if closed:
+                    self._close_file()
+                    self._thread = None
+                    return
+
+    def _write_batch(self, data):
+        try:
+            f = self._open()
+            f.write(data)
+            f.flush()
+        except (IOError, OSError) as e:
+            log.error("failed to write log: %s path: %s error: %s" % (self._file_name, self.file_path, e))
+
+    def _open(self):
+        file_name = time.strftime("%Y-%m-%d") + ".log"
+        if self._file is not None and file_name != self._file_name:
+            self._close_file()
+        if self._file is None:
+            if not os.path.exists(self.file_path):
+                os.makedirs(self.file_path)
+            self._file_name = file_name
+            self._file = open(self.file_path + file_name, mode="a", encoding="utf-8", errors="replace")
+        elif self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._close_file()
+            self._rotate(file_name)
+            self._file_name = file_name
+            self._file = open(self.file_path + file_name, mode="a", encoding="utf-8", errors="replace")
+        return self._file
+
+    def _rotate(self, file_name):
+        base = self.file_path + file_name
+        if self.backup_count < 1:
+            os.remove(base)
+            return
+        # The oldest file is overwritten by the one before it.
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists("%s.%d" % (base, i)):
+                os.replace("%s.%d" % (base, i), "%s.%d" % (base, i + 1))
+        os.replace(base, base + ".1")
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except (IOError, OSError) as e:
+                log.error("failed to close log: %s error: %s" % (self._file_name, e))
+            self._file = None
@@ -0,0 +1,73 @@
+""" Consistent hashing, to spread keys over a changing set of nodes. """
+import bisect
+import hashlib
+
+
+class HashRing:
+    """
+    A consistent hash ring.
+
+    Each node is placed on the ring at `replicas` points, and a key belongs
+    to the first node point at or after the key's hash. Adding or removing
+    a node only moves the keys of that node.
+    """
+
+    def __init__(self, nodes=None, replicas=100):
+        """
+        Initialize the ring.
+
+        :param nodes: The initial nodes.
+        :type nodes: list | None
+        :param replicas: The number of points per node.
+        :type replicas: int
+        """
+        self.replicas = replicas
+        self._points = []
+        self._owners = dict()
+        for node in nodes or []:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(str(value).encode("utf-8")).hexdigest()[:16], 16)
+
+    @property
+    def nodes(self):
+        """ A list of the nodes on the ring. """
+        return list(dict.fromkeys(self._owners.values()))
+
+    def add(self, node):
+        """
+        Add a node to the ring.
+
+        :param node: The node to add.
+        """
+        for i in range(self.replicas):
+            point = self._hash(f"{node}:{i}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+            self._owners[point] = node
+
+    def remove(self, node):
+        """
+        Remove a node from the ring.
+
+        :param node: The node to remove.
+        """
+        for i in range(self.replicas):
+            point = self._hash(f"{node}:{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.pop(bisect.bisect_left(self._points, point))
+
+    def get(self, key):
+        """
+        Get the node a key belongs to.
+
+        :param key: The key, e.g a room name.
+        :return: The node, or None if the ring is empty.
+        """
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[i]]
@@ -0,0 +1,132 @@
+""" A trigram and prefix index for searching nick names. """
+import bisect
+
+
+class NickIndex:
+    """
+    Index of nick names by key, for substring and prefix searches.
+
+    Substring searches intersect the trigram sets of the search string,
+    and then check the few remaining candidates. Prefix searches use a
+    sorted list of the lower case nick names. Both are case-insensitive
+    in the index, case-sensitive searches filter the candidates afterwards.
+    """
+
+    def __init__(self):
+        self._nicks = dict()
+        self._order = dict()
+        self._seq = 0
+        self._trigrams = dict()
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._nicks)
+
+    def __contains__(self, key):
+        return key in self._nicks
+
+    @staticmethod
+    def _trigrams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, key, nick):
+        """
+        Add or update the nick name of a key.
+
+        :param key: The key, e.g a user ID (handle) or a ban ID.
+        :param nick: The nick name.
+        :type nick: str
+        """
+        seq = self._order.get(key)
+        if seq is not None:
+            if self._nicks[key] == nick:
+                return
+            # An updated nick keeps its place in the order.
+            self._remove_entries(key, self._nicks[key], seq)
+        else:
+            self._seq += 1
+            seq = self._seq
+            self._order[key] = seq
+        # Assigning to an existing key keeps its place, so _nicks stays in order.
+        self._nicks[key] = nick
+        lower = nick.lower()
+        for trigram in self._trigrams_of(lower):
+            self._trigrams.setdefault(trigram, set()).add(key)
+        bisect.insort(self._sorted, (lower, seq, key))
+
+    def delete(self, key):
+        """
+        Remove a key from the index.
+
+        :param key: The key to remove.
+        """
+        nick = self._nicks.pop(key, None)
+        if nick is None:
+            return
+        self._remove_entries(key, nick, self._order.pop(key))
+
+    def _remove_entries(self, key, nick, seq):
+        lower = nick.lower()
+        for trigram in self._trigrams_of(lower):
+            keys = self._trigrams[trigram]
+            keys.discard(key)
+            if not keys:
+                del self._trigrams[trigram]
+        i = bisect.bisect_left(self._sorted, (lower, seq))
+        if i < len(self._sorted) and self._sorted[i][2] == key:
+            del self._sorted[i]
+
+    def clear(self):
+        """ Clear the index. """
+        self._nicks.clear()
+        self._order.clear()
+        self._trigrams.clear()
+        del self._sorted[:]
+
+    def _in_order(self, keys):
+        if len(keys) > len(self._nicks) // 8:
+            # Many keys, filtering _nicks, which is in order, is cheaper than sorting them.
+            keys = keys if isinstance(keys, set) else set(keys)
+            return [key for key in self._nicks if key in keys]
+        return sorted(keys, key=self._order.__getitem__)
+
+    def search(self, text, ignore_case=False, prefix=False):
+        """
+        Search for keys whose nick name contains, or starts with, a string.
+
+        :param text: The string to search for.
+        :type text: str
+        :param ignore_case: Match regardless of case.
+        :type ignore_case: bool
+        :param prefix: Only match nick names starting with the string.
+        :type prefix: bool
+        :return: A list of matching keys, in the order they were first added.
+        :rtype: list
+        """
+        text = str(text)
+        lower = text.lower()
+        if prefix:
+            start = bisect.bisect_left(self._sorted, (lower,))
+            end = len(self._sorted)
+            if lower:
+                # The first string after all the strings starting with lower.
+                end = bisect.bisect_left(self._sorted, (lower[:-1] + chr(ord(lower[-1]) + 1),), start)
+            candidates = [entry[2] for entry in self._sorted[start:end]]
+            if not ignore_case:
+                candidates = [key for key in candidates if self._nicks[key].startswith(text)]
+            return self._in_order(candidates)
+
+        if len(lower) < 3:
+            # Too short for the trigram index, _nicks is in order so the scan needs no sorting.
+            if ignore_case:
+                return [key for key, nick in self._nicks.items() if lower in nick.lower()]
+            return [key for key, nick in self._nicks.items() if text in nick]
+
+        sets = sorted((self._trigrams.get(t, set()) for t in self._trigrams_of(lower)), key=len)
+        candidates = self._in_order(set.intersection(*sets) if sets[0] else set())
+        if len(lower) > 3:
+            # A single trigram is an exact match, longer strings need checking.
+            candidates = [key for key in candidates if lower in self._nicks[key].lower()]
+        if not ignore_case:
+            candidates = [key for key in candidates if text in self._nicks[key]]
+        return candidates
@@ -1,28 +1,70 @@
-""" Contains functions to make http GET and http POST with. version 0.0.6 """
+""" Contains functions to make http GET and http POST with. version 0.1.0 """
 import asyncio
 import time
 import logging
-import requests
-from requests.utils import quote, unquote
-from functools import partial, wraps
+from http.cookiejar import http2time
+from urllib.parse import quote, unquote
+
+import aiohttp
 
 __all__ = ["quote", "unquote"]
 
 log = logging.getLogger(__name__)
 
+# Maximum open connections in total, and per host.
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 8
+# Seconds an idle connection is kept open for reuse.
+KEEPALIVE_TIMEOUT = 30
+
+DEFAULT_HEADER = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64; rv:44.0) Gecko/20100101 Firefox/50.0",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+#  A session that all requests will use.
+_session = None
+
+
+def get_session():
+    """
+    Get the shared session, creating it on first use.
 
-#  A session that all requests will use...apparently not.
-__request_session = requests.session()
+    The session pools keep-alive connections, and keeps the cookies
+    between requests, e.g the login cookies.
 
+    :return: The shared session.
+    :rtype: aiohttp.ClientSession
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.CookieJar())
+    return _session
 
-def threaded(func):
-    @wraps(func)
-    async def wrap(*args, **kwargs):
-        loop = asyncio.get_event_loop()
 
-        return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+async def close_session():
+    """ Close the shared session and its connections. """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
 
-    return wrap
+
+def _find_cookie(cookie_name):
+    if _session is None:
+        return None
+    for cookie in _session.cookie_jar:
+        if cookie.key == cookie_name:
+            return cookie
+    return None
 
 
 def is_cookie_expired(cookie_name):
@@ -33,14 +75,12 @@ def is_cookie_expired(cookie_name):
     :return: True if expired else False or None if no cookie by that name was found.
     """
     if cookie_name:
-        expires = int
+        cookie = _find_cookie(cookie_name)
+        if cookie is None:
+            return None
         timestamp = int(time.time())
-        for cookie in __request_session.cookies:
-            if cookie.name == cookie_name:
-                expires = cookie.expires
-            else:
-                return None
-        if timestamp > expires:
+        expires = http2time(cookie["expires"]) if cookie["expires"] else None
+        if expires is not None and timestamp > expires:
             log.debug(
                 "cookie['%s'] is expired. time stamp: %s, expires: %s"
                 % (cookie_name, timestamp, expires)
@@ -59,12 +99,9 @@ def delete_cookie(cookie_name):
     :param cookie_name: str the cookie name.
     :return: True if deleted else False
     """
-    if cookie_name in __request_session.cookies:
-        del __request_session.cookies[cookie_name]
-        log.debug(
-            "deleting cookie: %s session cookies: %s"
-            % (cookie_name, __request_session.cookies)
-        )
+    if _find_cookie(cookie_name) is not None:
+        _session.cookie_jar.clear(lambda cookie: cookie.key == cookie_name)
+        log.debug("deleting cookie: %s" % cookie_name)
         return True
     return False
 
@@ -73,30 +110,18 @@ def has_cookie(cookie_name):
     """
     Check a cookie by name to see if it exist.
     :param cookie_name: str the name of the cookie.
-    :return: object request.session.cookie[cookie_name] or False if no cookie.
+    :return: object http.cookies.Morsel or False if no cookie.
      """
-    if cookie_name in __request_session.cookies:
-        log.debug("cookie found: %s" % __request_session.cookies[cookie_name])
-        return __request_session.cookies[cookie_name]
+    cookie = _find_cookie(cookie_name)
+    if cookie is not None:
+        log.debug("cookie found: %s" % cookie)
+        return cookie
     log.debug("no cookie named: %s found." % cookie_name)
     return False
 
 
-@threaded
-def http_get(url, **kwargs):
-    json = kwargs.get("json", False)
-    proxy = kwargs.get("proxy", "")
-    header = kwargs.get("header")
-    timeout = kwargs.get("timeout", 20)
-    referer = kwargs.get("referer")
-
-    default_header = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64; rv:44.0) Gecko/20100101 Firefox/50.0",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate",
-        "Connection": "keep-alive",
-    }
+async def _request(method, url, json, proxy, header, timeout, referer, **kwargs):
+    default_header = dict(DEFAULT_HEADER)
 
     if referer is not None:
         default_header["Referer"] = referer
@@ -105,65 +130,61 @@ def http_get(url, **kwargs):
         default_header.update(header)
 
     if proxy:
-        proxy = {"https": "http://" + proxy}
-
-    gr = None
-    json_response = None
+        proxy = "http://" + proxy
+    else:
+        proxy = None
 
     try:
-        gr = __request_session.request(
-            method="GET",
-            url=url,
+        async with get_session().request(
+            method,
+            url,
             headers=default_header,
-            proxies=proxy,
-            timeout=timeout,
-        )
-        if json:
-            json_response = gr.json()
-    except ValueError as ve:
-        log.error("error while decoding %s to json: %s" % (url, ve))
-    except (requests.ConnectionError, requests.RequestException) as re:
-        log.error("http_get error: %s" % re)
-    finally:
-        log.debug("cookies: %s" % __request_session.cookies)
-        if gr is None:
-            return dict(
-                content=None,
-                json=None,
-                cookies=None,
-                headers=None,
-                status_code=None,
-            )
-        else:
+            proxy=proxy,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            **kwargs,
+        ) as r:
+            content = await r.text(errors="replace")
+            json_response = None
+            if json:
+                try:
+                    json_response = await r.json(content_type=None)
+                except ValueError as ve:
+                    log.error("error while decoding %s to json: %s" % (url, ve))
             return dict(
-                content=gr.text,
+                content=content,
                 json=json_response,
-                cookies=gr.cookies,
-                headers=gr.headers,
-                status_code=gr.status_code,
+                cookies=r.cookies,
+                headers=r.headers,
+                status_code=r.status,
             )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        log.error("http %s error: %s" % (method, e))
+        return dict(
+            content=None,
+            json=None,
+            cookies=None,
+            headers=None,
+            status_code=None,
+        )
 
 
-@threaded
-def http_post(post_url, post_data, **kwargs):
+async def http_get(url, **kwargs):
     json = kwargs.get("json", False)
     proxy = kwargs.get("proxy", "")
     header = kwargs.get("header")
     timeout = kwargs.get("timeout", 20)
     referer = kwargs.get("referer")
-    stream = kwargs.get("is_stream", False)
-    redirect = kwargs.get("follow_redirect", False)
 
-    default_header = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64; rv:44.0) Gecko/20100101 Firefox/50.0",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate",
-        "Connection": "keep-alive",
-    }
+    return await _request("GET", url, json, proxy, header, timeout, referer)
 
-    if referer is not None:
-        default_header["Referer"] = referer
+
+async def http_post(post_url, post_data, **kwargs):
+    json = kwargs.get("json", False)
+    proxy = kwargs.get("proxy", "")
+    header = kwargs.get("header")
+    timeout = kwargs.get("timeout", 20)
+    referer = kwargs.get("referer")
+    redirect = kwargs.get("follow_redirect", False)
 
     if not post_url:
         raise ValueError("no post_url provided. post_url=%s" % post_url)
@@ -172,48 +193,8 @@ def http_post(post_url, post_data, **kwargs):
             "proxy must be of type str and in the format ip:port. proxy type=%s"
             % type(proxy)
         )
-    else:
-        if header is not None and type(header) is dict:
-            default_header.update(header)
-
-        if proxy:
-            proxy = {"http": "http://" + proxy}
-
-        pr = None
-        json_response = None
-
-        try:
-            pr = __request_session.request(
-                method="POST",
-                url=post_url,
-                data=post_data,
-                headers=default_header,
-                allow_redirects=redirect,
-                proxies=proxy,
-                timeout=timeout,
-                stream=stream,
-            )
-            if json:
-                json_response = pr.json()
-        except ValueError as ve:
-            log.error("error while decoding %s to json: %s" % (post_url, ve))
-        except (requests.HTTPError, requests.RequestException) as pe:
-            log.error("http_post error %s" % pe)
-        finally:
-            log.debug("cookies: %s" % __request_session.cookies)
-            if pr is None:
-                return dict(
-                    content=None,
-                    json=None,
-                    cookies=None,
-                    headers=None,
-                    status_code=None,
-                )
-            else:
-                return dict(
-                    content=pr.text,
-                    json=json_response,
-                    cookies=pr.cookies,
-                    headers=pr.headers,
-                    status_code=pr.status_code,
-                )
+
+    return await _request(
+        "POST", post_url, json, proxy, header, timeout, referer,
+        data=post_data, allow_redirects=redirect,
+    )